@@ -1,12 +1,31 @@
+from contextlib import contextmanager
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import Tenant, User, Product, Order, OrderItem
+from .analytics import record_order, remove_orders
+from .models import (
+    Tenant, User, Product, Order, OrderItem, StockReservation, DailySales, ProductDailySales,
+    IdempotencyKey, OutboxEvent
+)
+
+
+def _summarized(orders):
+    return orders.exclude(status=Order.Status.CANCELLED)
+
+
+@contextmanager
+def resummarized(order_ids):
+    """Take the orders out of the sales summaries and add them back as they are after the block"""
+    remove_orders(_summarized(Order.objects.filter(id__in=order_ids)))
+    yield
+    for order in _summarized(Order.objects.filter(id__in=order_ids)).prefetch_related('items'):
+        record_order(order, order.items.all())
 
 
 @admin.register(Tenant)
 class TenantAdmin(admin.ModelAdmin):
-    list_display = ['store_name', 'subdomain', 'contact_email', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['store_name', 'subdomain', 'contact_email', 'is_active', 'is_read_only', 'created_at']
+    list_filter = ['is_active', 'is_read_only', 'created_at']
     search_fields = ['store_name', 'subdomain', 'contact_email']
 
 
@@ -45,9 +64,82 @@ class OrderAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     inlines = [OrderItemInline]
 
+    # Keep the sales summaries in step with edits made here. The order is
+    # taken out before it is saved and added back once its items are saved.
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            remove_orders(_summarized(Order.objects.filter(id=obj.pk)))
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        order = form.instance
+        if order.status != Order.Status.CANCELLED:
+            record_order(order, order.items.all())
+
+    def delete_model(self, request, obj):
+        with resummarized([obj.pk]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with resummarized(set(queryset.values_list('id', flat=True))):
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product', 'quantity', 'price_at_order', 'subtotal']
     search_fields = ['order__order_number', 'product__name']
     readonly_fields = ['subtotal']
+
+    def save_model(self, request, obj, form, change):
+        order_ids = {obj.order_id}
+        if change:
+            order_ids.add(OrderItem.objects.get(pk=obj.pk).order_id)
+        with resummarized(order_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with resummarized([obj.order_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with resummarized(set(queryset.values_list('order_id', flat=True))):
+            super().delete_queryset(request, queryset)
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'customer', 'tenant', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['tenant', 'status', 'expires_at']
+    search_fields = ['product__name', 'product__sku', 'customer__username']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'tenant', 'order_count', 'units', 'revenue']
+    list_filter = ['tenant', 'date']
+
+
+@admin.register(ProductDailySales)
+class ProductDailySalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product', 'tenant', 'order_count', 'units', 'revenue']
+    list_filter = ['tenant', 'date']
+    search_fields = ['product__name', 'product__sku']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'tenant', 'status_code', 'expires_at', 'created_at']
+    list_filter = ['tenant', 'status_code']
+    search_fields = ['key', 'user__username']
+    readonly_fields = ['created_at']
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'tenant', 'status', 'attempts', 'next_attempt_at', 'created_at']
+    list_filter = ['tenant', 'status', 'event_type']
+    readonly_fields = ['created_at', 'delivered_at']
@@ -0,0 +1,183 @@
+"""
+Pre-aggregated sales summaries.
+
+DailySales and ProductDailySales hold per-tenant, per-day order counts,
+units and revenue of every order that is not cancelled. They are updated
+incrementally in the same transaction as the order change - one upsert
+statement per table - so dashboards read O(days) summary rows instead of
+scanning orders and order items. rebuild_sales_summary recomputes them
+from scratch (manage.py rebuild_sales_summary).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, DailySales, ProductDailySales
+from .routers import db_for_tenant, tenant_databases, use_tenant_database
+
+VALUE_FIELDS = ('order_count', 'units', 'revenue')
+
+
+def _add_to_summary(model, key_fields, rows):
+    """
+    Add the value fields of `rows` to the summary rows with the same keys,
+    creating missing ones. SQLite and PostgreSQL do it in one
+    INSERT ... ON CONFLICT DO UPDATE statement.
+    """
+    if not rows:
+        return
+
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        for row in rows:
+            lookup = {field: row[field] for field in key_fields}
+            updated = model.objects.filter(**lookup).update(
+                **{field: F(field) + row[field] for field in VALUE_FIELDS}
+            )
+            if not updated:
+                model.objects.create(**row)
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields + VALUE_FIELDS]
+    columns = ', '.join(qn(field.column) for field in fields)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows))
+    conflict = ', '.join(qn(model._meta.get_field(name).column) for name in key_fields)
+    updates = ', '.join(
+        f"{qn(name)} = {table}.{qn(name)} + excluded.{qn(name)}" for name in VALUE_FIELDS
+    )
+    params = [
+        field.get_db_prep_save(row[field.name] if field.name in row else row[field.attname], connection)
+        for row in rows for field in fields
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) VALUES {placeholders} "
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+            params
+        )
+
+
+def record_order(order, order_items):
+    """Add a new order and its items to the summaries"""
+    date = timezone.localdate(order.created_at)
+
+    products = defaultdict(lambda: {'units': 0, 'revenue': Decimal('0')})
+    for item in order_items:
+        products[item.product_id]['units'] += item.quantity
+        products[item.product_id]['revenue'] += item.subtotal
+
+    _add_to_summary(DailySales, ('tenant_id', 'date'), [{
+        'tenant_id': order.tenant_id, 'date': date, 'order_count': 1,
+        'units': sum(values['units'] for values in products.values()),
+        'revenue': order.total_amount,
+    }])
+    _add_to_summary(ProductDailySales, ('tenant_id', 'product_id', 'date'), [
+        {'tenant_id': order.tenant_id, 'product_id': product_id, 'date': date, 'order_count': 1, **values}
+        for product_id, values in sorted(products.items())
+    ])
+
+
+def _daily_totals(orders):
+    """(tenant_id, date) -> totals of the orders queryset, two aggregate queries"""
+    totals = {}
+    for row in (
+        orders.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('tenant_id', 'day')
+        .annotate(order_count=Count('id'), revenue=Sum('total_amount'))
+    ):
+        totals[row['tenant_id'], row['day']] = {
+            'tenant_id': row['tenant_id'], 'date': row['day'],
+            'order_count': row['order_count'], 'units': 0, 'revenue': row['revenue'],
+        }
+
+    for row in (
+        OrderItem.objects.filter(order__in=orders).order_by()
+        .annotate(day=TruncDate('order__created_at'))
+        .values('order__tenant_id', 'day')
+        .annotate(units=Sum('quantity'))
+    ):
+        totals[row['order__tenant_id'], row['day']]['units'] = row['units']
+
+    return totals.values()
+
+
+def _product_daily_totals(orders):
+    """Per product and day totals of the orders queryset, one aggregate query"""
+    return (
+        {
+            'tenant_id': row['order__tenant_id'], 'product_id': row['product_id'], 'date': row['day'],
+            'order_count': row['order_count'], 'units': row['units'], 'revenue': row['revenue'],
+        }
+        for row in (
+            OrderItem.objects.filter(order__in=orders).order_by()
+            .annotate(day=TruncDate('order__created_at'))
+            .values('order__tenant_id', 'product_id', 'day')
+            .annotate(order_count=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum('subtotal'))
+            .iterator()
+        )
+    )
+
+
+def remove_orders(orders):
+    """Take the orders of a queryset (e.g. just cancelled or about to be deleted) out of the summaries"""
+    def negate(rows):
+        return [dict(row, **{field: -row[field] for field in VALUE_FIELDS}) for row in rows]
+
+    _add_to_summary(DailySales, ('tenant_id', 'date'), negate(_daily_totals(orders)))
+
+    product_rows = _product_daily_totals(orders)
+    while True:
+        batch = list(islice(product_rows, 500))
+        if not batch:
+            break
+        _add_to_summary(ProductDailySales, ('tenant_id', 'product_id', 'date'), negate(batch))
+
+
+def rebuild_sales_summary(tenant_id=None, batch_size=1000):
+    """Recompute the summaries from orders, for one tenant or all. Returns (days, product days) written."""
+    databases = tenant_databases() if tenant_id is None else [db_for_tenant(tenant_id)]
+    days = product_days = 0
+    for alias in databases:
+        with use_tenant_database(alias):
+            written = _rebuild(alias, tenant_id, batch_size)
+        days += written[0]
+        product_days += written[1]
+    return days, product_days
+
+
+def _rebuild(using, tenant_id, batch_size):
+    orders = Order.objects.exclude(status=Order.Status.CANCELLED)
+    daily = DailySales.objects.all()
+    product_daily = ProductDailySales.objects.all()
+    if tenant_id is not None:
+        orders = orders.filter(tenant_id=tenant_id)
+        daily = daily.filter(tenant_id=tenant_id)
+        product_daily = product_daily.filter(tenant_id=tenant_id)
+
+    with transaction.atomic(using=using):
+        daily.delete()
+        product_daily.delete()
+
+        days = DailySales.objects.bulk_create(
+            [DailySales(**row) for row in _daily_totals(orders)], batch_size=batch_size
+        )
+
+        product_days = 0
+        product_rows = _product_daily_totals(orders)
+        while True:
+            batch = [ProductDailySales(**row) for row in islice(product_rows, batch_size)]
+            if not batch:
+                break
+            ProductDailySales.objects.bulk_create(batch)
+            product_days += len(batch)
+
+    return len(days), product_days
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.db import router
+from django.db.models.base import DEFERRED
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+
+class AuthContext:
+    """
+    Result of decoding the bearer token of a request exactly once.
+    Holds either the validated token and its claims, or the authentication error.
+    """
+    __slots__ = ['validated_token', 'tenant_id', 'role', 'user_id', 'error']
+
+    def __init__(self, validated_token=None, error=None):
+        self.validated_token = validated_token
+        self.error = error
+        self.tenant_id = None
+        self.role = None
+        self.user_id = None
+
+        if validated_token is not None:
+            self.tenant_id = validated_token.get('tenant_id')
+            self.role = validated_token.get('role')
+            self.user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+
+
+# Shared instance - JWTAuthentication keeps no per-request state
+_jwt_auth = JWTAuthentication()
+
+
+def resolve_auth_context(request):
+    """
+    Decode and verify the bearer token of a Django request.
+    Returns None when the request carries no JWT credentials.
+    """
+    header = _jwt_auth.get_header(request)
+    if header is None:
+        return None
+
+    try:
+        raw_token = _jwt_auth.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return AuthContext(validated_token=_jwt_auth.get_validated_token(raw_token))
+    except AuthenticationFailed as e:
+        # InvalidToken is a subclass - keep the error so DRF can report it later
+        return AuthContext(error=e)
+
+
+# Token claim -> User attribute materialized by the stateless principal
+PRINCIPAL_CLAIMS = {
+    api_settings.USER_ID_CLAIM: 'id',
+    'tenant_id': 'tenant_id',
+    'role': 'role',
+    'is_active': 'is_active',
+    'username': 'username',
+    'email': 'email',
+}
+
+
+def principal_from_token(validated_token):
+    """
+    Build a User from the token claims without touching the users table.
+    Every other field is deferred and loaded from the database on first access.
+    Returns None for tokens issued before these claims existed.
+    """
+    values = {}
+    for claim, attname in PRINCIPAL_CLAIMS.items():
+        if claim not in validated_token:
+            return None
+        values[attname] = validated_token[claim]
+
+    if not values['is_active']:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+    # Model.from_db expects values in concrete field order, DEFERRED for the rest
+    field_names = [f.attname for f in User._meta.concrete_fields]
+    row = [values.get(name, DEFERRED) for name in field_names]
+    return User.from_db(router.db_for_read(User), field_names, row)
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that reuses the token already decoded by TenantMiddleware.
+    Falls back to regular decoding when the middleware did not run for the request.
+
+    With settings.STATELESS_PRINCIPAL enabled the user is built from the token
+    claims instead of being fetched from the users table.
+    """
+
+    def authenticate(self, request):
+        try:
+            context = request._request.auth_context
+        except AttributeError:
+            return super().authenticate(request)
+
+        if context is None:
+            return None
+
+        if context.error is not None:
+            raise context.error
+
+        return self.get_user(context.validated_token), context.validated_token
+
+    def get_user(self, validated_token):
+        if getattr(settings, 'STATELESS_PRINCIPAL', False):
+            user = principal_from_token(validated_token)
+            if user is not None:
+                return user
+        return super().get_user(validated_token)
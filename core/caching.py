@@ -0,0 +1,185 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .routers import db_for_tenant, reading_from_replica, replica_alias
+
+
+class TenantVersions:
+    """
+    Per-tenant version numbers kept in the cache, one series per `name`.
+
+    A version only ever grows: bump() increments it, and a version that was
+    never read or got evicted starts again from the clock, past every value
+    handed out before. Anything derived from a version (cache keys, ETags)
+    is therefore never reused for different data.
+
+    With a read replica, bumps also leave a marker for REPLICA_PIN_SECONDS:
+    while it is set, data read from the replica may predate the version.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+    def _key(self, tenant_id):
+        return f'{self.name}:{tenant_id}:version'
+
+    def get(self, tenant_id):
+        key = self._key(tenant_id)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, time.time_ns(), timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    def _recently_bumped_key(self, tenant_id):
+        return f'{self.name}:{tenant_id}:recently-bumped'
+
+    def bump(self, tenant_id):
+        if replica_alias():
+            self.cache.set(self._recently_bumped_key(tenant_id), True, settings.REPLICA_PIN_SECONDS)
+        try:
+            self.cache.incr(self._key(tenant_id))
+        except ValueError:
+            # Version was never read or got evicted
+            self.cache.add(self._key(tenant_id), time.time_ns(), timeout=None)
+
+    def bump_on_commit(self, tenant_id):
+        """
+        Bump once the current transaction commits, so a concurrent request
+        cannot pair the pre-commit data with the new version.
+        """
+        transaction.on_commit(lambda: self.bump(tenant_id), using=db_for_tenant(tenant_id))
+
+    def may_lag(self, tenant_id):
+        """
+        True while this request reads from the replica and the replica may
+        not have the change behind the last bump yet: its data must not be
+        paired with the current version.
+        """
+        return reading_from_replica() and bool(self.cache.get(self._recently_bumped_key(tenant_id)))
+
+
+# Bumped by every change to a tenant's orders (see core/signals.py and core/services.py)
+order_versions = TenantVersions('orders')
+
+
+class CatalogCache:
+    """
+    Versioned response cache for a tenant's catalog.
+
+    Every tenant has a catalog version number; cached responses are keyed by
+    it, so bumping the version invalidates all of the tenant's entries at once
+    without having to find them. Works with any Django cache backend
+    (local memory, file based, database, ...) selected by CATALOG_CACHE_ALIAS.
+    """
+
+    def __init__(self):
+        self.versions = TenantVersions('catalog')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return self.versions.cache
+
+    def version(self, tenant_id):
+        return self.versions.get(tenant_id)
+
+    def bump(self, tenant_id):
+        """Invalidate every cached response of the tenant"""
+        self.versions.bump(tenant_id)
+
+    def bump_on_commit(self, tenant_id):
+        """
+        Bump once the current transaction commits, so a concurrent request
+        cannot cache the pre-commit catalog under the new version.
+        """
+        transaction.on_commit(lambda: self.bump(tenant_id), using=db_for_tenant(tenant_id))
+
+    def make_key(self, tenant_id, *parts):
+        digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+        return f'catalog:{tenant_id}:{self.version(tenant_id)}:{digest}'
+
+    def get(self, key):
+        data = self.cache.get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        self.cache.set(key, data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+
+    def may_store(self, tenant_id):
+        """
+        False while the replica may still lag behind the last catalog change:
+        a response read from it would be cached under the new version.
+        """
+        return not self.versions.may_lag(tenant_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+catalog_cache = CatalogCache()
+
+
+class CatalogCacheMixin:
+    """
+    Serve list and retrieve responses of a tenant's catalog from catalog_cache.
+    Responses are keyed by tenant, role, host, path and query parameters;
+    only successful responses are cached. Permission checks still run on
+    every request because DRF performs them before list/retrieve.
+    The X-Cache response header says whether the cache had the response (HIT / MISS).
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_catalog_scope(self, request):
+        """(tenant id, audience) the response is cached for"""
+        return request.user.tenant_id, request.user.role
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        tenant_id, audience = self.get_catalog_scope(request)
+        key = catalog_cache.make_key(
+            tenant_id, audience, request.get_host(), request.path,
+            sorted(request.query_params.lists())
+        )
+
+        data = catalog_cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and catalog_cache.may_store(tenant_id):
+            catalog_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
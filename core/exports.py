@@ -0,0 +1,167 @@
+"""
+Streaming order export (CSV / JSONL) for store owners.
+
+Orders are read in chunks of ORDER_EXPORT_CHUNK_SIZE, walking the
+(tenant, created_at, id) index with a keyset instead of OFFSET, and each
+chunk's items are fetched with one more query - two queries per chunk,
+customers and products joined in. Nothing is held beyond the current chunk,
+so memory stays flat however many orders the tenant has.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, OrderItem
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    JSONL: 'application/x-ndjson; charset=utf-8',
+}
+
+ORDER_COLUMNS = ['order_number', 'created_at', 'status', 'customer', 'total_amount', 'shipping_address']
+ITEM_COLUMNS = ['product_sku', 'product_name', 'quantity', 'price_at_order', 'subtotal']
+
+# Spreadsheet apps run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_bound(value):
+    """Aware datetime from an ISO date or datetime; dates mean midnight. Raises ValueError."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{value} is not an ISO date or datetime")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def iter_order_chunks(tenant_id, status=None, created_after=None, created_before=None, chunk_size=None,
+                      using=None):
+    """
+    Yield lists of (order dict, [item dicts]) oldest first, one list per chunk.
+    `using` is the database alias to read from, routed as usual when None.
+    """
+    chunk_size = chunk_size or settings.ORDER_EXPORT_CHUNK_SIZE
+
+    orders = Order.objects.using(using).filter(tenant_id=tenant_id)
+    if status:
+        orders = orders.filter(status=status)
+    if created_after:
+        orders = orders.filter(created_at__gte=created_after)
+    if created_before:
+        orders = orders.filter(created_at__lt=created_before)
+    orders = orders.order_by('created_at', 'id').values(
+        'id', 'order_number', 'created_at', 'status', 'customer__username', 'total_amount', 'shipping_address'
+    )
+
+    last = None
+    while True:
+        page = orders
+        if last is not None:
+            page = orders.filter(
+                Q(created_at__gt=last['created_at']) | Q(created_at=last['created_at'], id__gt=last['id'])
+            )
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+
+        items = defaultdict(list)
+        rows = (
+            OrderItem.objects.using(using)
+            .filter(order_id__in=[order['id'] for order in chunk])
+            .order_by('id')
+            .values('order_id', 'product__sku', 'product__name', 'quantity', 'price_at_order', 'subtotal')
+        )
+        for item in rows:
+            items[item['order_id']].append({
+                'product_sku': item['product__sku'],
+                'product_name': item['product__name'],
+                'quantity': item['quantity'],
+                'price_at_order': item['price_at_order'],
+                'subtotal': item['subtotal'],
+            })
+
+        yield [
+            ({
+                'order_number': order['order_number'],
+                'created_at': order['created_at'],
+                'status': order['status'],
+                'customer': order['customer__username'],
+                'total_amount': order['total_amount'],
+                'shipping_address': order['shipping_address'],
+            }, items.get(order['id'], []))
+            for order in chunk
+        ]
+
+        last = chunk[-1]
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _LineBuffer:
+    """File-like object for csv.writer that keeps the written lines until taken"""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def take(self):
+        data, self.lines = ''.join(self.lines), []
+        return data
+
+
+def stream_csv(chunks):
+    """One line per order item; orders without items get one line with empty item columns"""
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_COLUMNS + ITEM_COLUMNS)
+    yield buffer.take()
+
+    empty_item = [''] * len(ITEM_COLUMNS)
+    for chunk in chunks:
+        for order, items in chunk:
+            order_cells = [_csv_cell(order[column]) for column in ORDER_COLUMNS]
+            if not items:
+                writer.writerow(order_cells + empty_item)
+            for item in items:
+                writer.writerow(order_cells + [_csv_cell(item[column]) for column in ITEM_COLUMNS])
+        yield buffer.take()
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    # Decimal - keep it exact as a string
+    return str(value)
+
+
+def stream_jsonl(chunks):
+    """One JSON object per order with its items nested"""
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps(dict(order, items=items), default=_json_default, ensure_ascii=False) + '\n'
+            for order, items in chunk
+        )
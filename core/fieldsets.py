@@ -0,0 +1,90 @@
+"""
+Sparse fieldsets: ?fields=id,name,price keeps only the listed fields,
+?omit=description drops fields. Serializers trim their output with
+SparseFieldsetMixin and views push the same selection into the query
+with project_queryset, so unrequested columns and joins are skipped.
+Only read (GET/HEAD) requests are trimmed.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def _param_names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def selected_fields(request, available):
+    """Names of `available` selected by the request, or None when it selects all of them"""
+    fields, omit = _param_names(request, FIELDS_PARAM), _param_names(request, OMIT_PARAM)
+    if fields is None and omit is None:
+        return None
+
+    unknown = ((fields or set()) | (omit or set())) - set(available)
+    if unknown:
+        raise serializers.ValidationError({
+            FIELDS_PARAM if fields and unknown & fields else OMIT_PARAM:
+                [f"Unknown field: {name}" for name in sorted(unknown)]
+        })
+
+    selected = set(available) if fields is None else fields
+    return selected - (omit or set())
+
+
+class SparseFieldsetMixin:
+    """Drop the fields the request's ?fields= / ?omit= did not select. Sets `sparse` when it did."""
+    sparse = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        selected = selected_fields(request, self.fields)
+        if selected is not None:
+            for name in set(self.fields) - selected:
+                self.fields.pop(name)
+            self.sparse = True
+
+
+def project_queryset(queryset, serializer, always=('id', 'created_at')):
+    """
+    Load only the columns the serializer's remaining fields read, and join
+    only the relations they traverse. `always` are columns needed by the
+    view itself (keyset pagination reads id and created_at).
+    """
+    opts = queryset.model._meta
+    columns = set(always)
+    joins = set()
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        attrs = field.source_attrs
+        try:
+            model_field = opts.get_field(attrs[0])
+        except FieldDoesNotExist:
+            # Annotation or property - nothing to load for it here
+            continue
+
+        if not model_field.concrete or model_field.many_to_many:
+            # Reverse and many-to-many relations are prefetched by the view
+            continue
+
+        columns.add(model_field.name)
+        if len(attrs) > 1 and model_field.is_relation:
+            joins.add(model_field.name)
+            columns.add('__'.join(attrs[:2]))
+
+    if joins:
+        queryset = queryset.select_related(*sorted(joins))
+    return queryset.only(*sorted(columns))
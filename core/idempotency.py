@@ -0,0 +1,193 @@
+"""
+Idempotency-Key support for POST endpoints that create things.
+
+The first request with a key claims it by inserting an IdempotencyKey row
+(the unique constraint on tenant, user and key picks one winner among
+concurrent duplicates). The winner does the work and stores its response
+in the same transaction, so either both the order and the response are
+saved or neither is. Repeats get the stored response back; duplicates
+arriving while the first is still running get 409, and a key reused for a
+different request gets 422. A claim whose request died is taken over after
+IDEMPOTENCY_LOCK_TIMEOUT. Keys expire after IDEMPOTENCY_KEY_TTL and are
+deleted by the purge_idempotency_keys command.
+"""
+import hashlib
+import json
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from .routers import db_for_tenant, tenant_databases, use_tenant_database
+
+HEADER = 'Idempotency-Key'
+
+
+class KeyInUse(Exception):
+    """Another request holds the key; `wait` is the number of seconds until its claim lapses"""
+
+    def __init__(self, wait):
+        super().__init__(wait)
+        self.wait = wait
+
+
+class KeyMismatch(Exception):
+    """The key was used with a different request"""
+
+
+def request_fingerprint(request):
+    """SHA-256 of the method, path and parsed body"""
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def claim_key(tenant_id, user_id, key, fingerprint):
+    """
+    Claim the key for a new request. Returns (row, claimed): claimed is
+    False when the key already has a response to replay. Raises KeyInUse or
+    KeyMismatch.
+    """
+    lookup = {'tenant_id': tenant_id, 'user_id': user_id, 'key': key}
+    using = db_for_tenant(tenant_id)
+    while True:
+        now = timezone.now()
+        locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        try:
+            # Retries are the common case for a known key: one SELECT to replay
+            row = IdempotencyKey.objects.get(**lookup)
+        except IdempotencyKey.DoesNotExist:
+            try:
+                with transaction.atomic(using=using):
+                    row = IdempotencyKey.objects.create(
+                        fingerprint=fingerprint,
+                        locked_until=locked_until,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                        **lookup
+                    )
+                return row, True
+            except IntegrityError:
+                # A concurrent duplicate got there first
+                continue
+
+        if row.expires_at <= now:
+            # Expired keys are free to reuse for anything
+            claimed = IdempotencyKey.objects.filter(pk=row.pk, expires_at=row.expires_at).update(
+                fingerprint=fingerprint, status_code=None, response_body=None,
+                locked_until=locked_until,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            )
+            if not claimed:
+                continue
+            row.fingerprint, row.status_code, row.response_body = fingerprint, None, None
+            row.locked_until = locked_until
+            return row, True
+
+        if row.fingerprint != fingerprint:
+            raise KeyMismatch()
+        if row.status_code is not None:
+            return row, False
+
+        if row.locked_until > now:
+            raise KeyInUse((row.locked_until - now).total_seconds())
+
+        # The request holding the claim died without saving anything - take over
+        claimed = IdempotencyKey.objects.filter(
+            pk=row.pk, status_code__isnull=True, locked_until=row.locked_until
+        ).update(locked_until=locked_until)
+        if claimed:
+            row.locked_until = locked_until
+            return row, True
+
+
+def complete_key(row, response):
+    """Store the response of the claim's request. False if the claim was taken over meanwhile."""
+    return bool(IdempotencyKey.objects.filter(
+        pk=row.pk, status_code__isnull=True, locked_until=row.locked_until
+    ).update(status_code=response.status_code, response_body=response.data))
+
+
+def release_key(row):
+    """Give the key up so the client can retry, e.g. after a validation error"""
+    IdempotencyKey.objects.filter(
+        pk=row.pk, status_code__isnull=True, locked_until=row.locked_until
+    ).delete()
+
+
+def purge_expired_keys(batch_size=1000, now=None):
+    """Delete expired keys in batches of one SELECT and one DELETE. Returns the number deleted."""
+    now = now or timezone.now()
+    total = 0
+    for alias in tenant_databases():
+        with use_tenant_database(alias):
+            while True:
+                ids = list(
+                    IdempotencyKey.objects.filter(expires_at__lte=now)
+                    .order_by('expires_at')
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                deleted, _ = IdempotencyKey.objects.filter(id__in=ids, expires_at__lte=now).delete()
+                total += deleted
+    return total
+
+
+class IdempotentCreateMixin:
+    """
+    Make create() idempotent for requests sending an Idempotency-Key header.
+    Only successful responses are stored; after an error the key is
+    released and the client can retry with it.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response(
+                {'error': f'{HEADER} must be 1 to 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        tenant_id = request.user.tenant_id
+        try:
+            row, claimed = claim_key(tenant_id, request.user.id, key, request_fingerprint(request))
+        except KeyMismatch:
+            return Response(
+                {'error': f'{HEADER} was already used with a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        except KeyInUse as e:
+            return Response(
+                {'error': f'A request with this {HEADER} is still in progress'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': str(math.ceil(e.wait))}
+            )
+
+        if not claimed:
+            return Response(row.response_body, status=row.status_code, headers={'Idempotent-Replayed': 'true'})
+
+        using = db_for_tenant(tenant_id)
+        try:
+            with transaction.atomic(using=using):
+                response = super().create(request, *args, **kwargs)
+                if status.is_success(response.status_code) and not complete_key(row, response):
+                    # Outlived the lock and another request took over: undo ours
+                    transaction.set_rollback(True, using=using)
+                    return Response(
+                        {'error': f'A request with this {HEADER} is still in progress'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+        except BaseException:
+            release_key(row)
+            raise
+
+        if not status.is_success(response.status_code):
+            release_key(row)
+        return response
@@ -0,0 +1,182 @@
+"""
+Bulk product import / upsert from CSV or JSONL.
+
+Input is read line by line and processed in chunks of PRODUCT_IMPORT_CHUNK_SIZE
+rows, so memory stays bounded whatever the file size. Each chunk is validated
+row by row, then upserted on the (tenant, sku) unique constraint with a single
+INSERT ... ON CONFLICT DO UPDATE in its own transaction.
+"""
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from .caching import catalog_cache
+from .models import Product
+from .routers import db_for_tenant
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+
+CONTENT_TYPES = {
+    'text/csv': CSV,
+    'application/csv': CSV,
+    'application/jsonl': JSONL,
+    'application/x-jsonlines': JSONL,
+    'application/x-ndjson': JSONL,
+}
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """One import row - products are matched on sku"""
+
+    class Meta:
+        model = Product
+        fields = ['sku', 'name', 'description', 'price', 'stock_quantity', 'is_active']
+
+
+# Empty CSV cells of these columns mean "not given" rather than an invalid value
+OPTIONAL_TYPED_COLUMNS = ('stock_quantity', 'is_active')
+
+
+class ImportReport:
+    """Counts and per-row errors of an import. Only the first max_errors errors are kept."""
+
+    def __init__(self, max_errors):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, row, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors),
+        }
+
+
+def detect_format(content_type=None, filename=None):
+    """Input format from a content type or file name, None if unknown"""
+    if content_type:
+        input_format = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+        if input_format:
+            return input_format
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in FORMATS:
+            return extension
+        if extension in ('ndjson', 'jsonlines'):
+            return JSONL
+    return None
+
+
+def _text_lines(byte_lines):
+    lines = codecs.iterdecode(byte_lines, 'utf-8')
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first.lstrip('\ufeff')
+    yield from lines
+
+
+def read_csv_rows(byte_lines):
+    """(row number, dict) for every CSV record; the header is row 1"""
+    reader = csv.DictReader(_text_lines(byte_lines))
+    for record in reader:
+        row = {
+            key: value for key, value in record.items()
+            if key is not None and not (key in OPTIONAL_TYPED_COLUMNS and value == '')
+        }
+        yield reader.line_num, row
+
+
+def read_jsonl_rows(byte_lines):
+    """(row number, dict or error message) for every non-blank JSONL line"""
+    for number, line in enumerate(_text_lines(byte_lines), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, f"Invalid JSON: {exc}"
+            continue
+        yield number, row if isinstance(row, dict) else "Each line must be a JSON object"
+
+
+def import_products(tenant_id, byte_lines, input_format, created_by=None, chunk_size=None, max_errors=None):
+    """
+    Upsert the tenant's products from an iterable of byte lines.
+    New SKUs are created; existing ones get the given columns updated.
+    Returns an ImportReport.
+    """
+    chunk_size = chunk_size or settings.PRODUCT_IMPORT_CHUNK_SIZE
+    report = ImportReport(settings.PRODUCT_IMPORT_MAX_ERRORS if max_errors is None else max_errors)
+    rows = read_csv_rows(byte_lines) if input_format == CSV else read_jsonl_rows(byte_lines)
+    validator = ProductImportSerializer()
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        # Later rows of the same SKU win - an upsert can't touch one row twice
+        valid = {}
+        for number, row in chunk:
+            if isinstance(row, str):
+                report.add_error(number, {'non_field_errors': [row]})
+                continue
+            try:
+                data = validator.run_validation(row)
+            except serializers.ValidationError as exc:
+                report.add_error(number, exc.detail)
+                continue
+            valid.pop(data['sku'], None)
+            valid[data['sku']] = (number, data)
+
+        if valid:
+            _upsert_chunk(tenant_id, valid, created_by, report)
+
+    if report.created or report.updated:
+        catalog_cache.bump_on_commit(tenant_id)
+    return report
+
+
+def _upsert_chunk(tenant_id, valid, created_by, report):
+    # Rows may give different columns; only given columns are updated
+    groups = {}
+    for number, data in valid.values():
+        groups.setdefault(tuple(sorted(data)), []).append(data)
+
+    try:
+        with transaction.atomic(using=db_for_tenant(tenant_id)):
+            existing = set(
+                Product.objects.filter(tenant_id=tenant_id, sku__in=list(valid)).values_list('sku', flat=True)
+            )
+            for columns, rows in groups.items():
+                Product.objects.bulk_create(
+                    [Product(tenant_id=tenant_id, created_by=created_by, **data) for data in rows],
+                    update_conflicts=True,
+                    unique_fields=['tenant', 'sku'],
+                    update_fields=[column for column in columns if column != 'sku'] + ['updated_at'],
+                )
+    except DatabaseError as exc:
+        for number, _ in valid.values():
+            report.add_error(number, {'non_field_errors': [f"Chunk could not be saved: {exc}"]})
+        return
+
+    report.updated += len(existing)
+    report.created += len(valid) - len(existing)
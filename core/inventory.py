@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import defaultdict, Counter
+
+from django.conf import settings
+from django.db import transaction, OperationalError
+from django.db.models import Case, When, F, Value
+from django.utils import timezone
+
+from .caching import catalog_cache
+from .models import Product
+from .routers import db_for_tenant
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more lines cannot be taken out of stock"""
+
+    def __init__(self, failed):
+        # product id -> units currently available (0 for unknown products)
+        self.failed = failed
+        super().__init__(f"Insufficient stock for products {sorted(failed)}")
+
+
+class InventoryMetrics:
+    """Thread-safe per-tenant counters for stock operations"""
+    COUNTERS = ['attempts', 'committed', 'insufficient', 'contention', 'retries']
+
+    def __init__(self):
+        self._counters = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, tenant_id, counter, amount=1):
+        with self._lock:
+            self._counters[tenant_id][counter] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                tenant_id: {name: counters[name] for name in self.COUNTERS}
+                for tenant_id, counters in self._counters.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+inventory_metrics = InventoryMetrics()
+
+
+def _quantity_case(quantities):
+    """CASE expression mapping product id -> quantity, one WHEN per distinct quantity"""
+    by_quantity = defaultdict(list)
+    for pk, qty in quantities.items():
+        by_quantity[qty].append(pk)
+    return Case(*[When(id__in=pks, then=Value(qty)) for qty, pks in by_quantity.items()])
+
+
+def _short_lines(tenant_id, quantities):
+    """Product id -> available units for every line the current stock cannot cover"""
+    available = dict(
+        Product.objects
+        .filter(tenant_id=tenant_id, id__in=quantities)
+        .values_list('id', 'stock_quantity')
+    )
+    return {
+        pk: available.get(pk, 0)
+        for pk, qty in quantities.items()
+        if available.get(pk, 0) < qty
+    }
+
+
+def decrement_stock(tenant_id, quantities):
+    """
+    Atomically take `quantities` (product id -> units) out of stock.
+
+    All lines are applied with one statement,
+    `stock_quantity = stock_quantity - n WHERE stock_quantity >= n`,
+    so concurrent checkouts can never oversell and only stock_quantity and
+    updated_at are written. Either every line is applied or none is:
+    InsufficientStock reports the lines that could not be covered.
+    Lock timeouts are retried with exponential backoff.
+    """
+    max_retries = getattr(settings, 'INVENTORY_MAX_RETRIES', 3)
+    backoff = getattr(settings, 'INVENTORY_RETRY_BACKOFF', 0.01)
+
+    # Stable ordering keeps lock acquisition order consistent between checkouts
+    quantities = dict(sorted(quantities.items()))
+    ordered = _quantity_case(quantities)
+
+    for attempt in range(max_retries + 1):
+        inventory_metrics.record(tenant_id, 'attempts')
+        try:
+            # Savepoint so a failed attempt leaves no partial decrements behind
+            with transaction.atomic(using=db_for_tenant(tenant_id)):
+                updated = Product.objects.filter(
+                    tenant_id=tenant_id,
+                    id__in=quantities,
+                    stock_quantity__gte=ordered,
+                ).update(
+                    stock_quantity=F('stock_quantity') - ordered,
+                    updated_at=timezone.now(),
+                )
+                if updated != len(quantities):
+                    raise InsufficientStock({})
+        except InsufficientStock:
+            failed = _short_lines(tenant_id, quantities)
+            if failed or attempt == max_retries:
+                inventory_metrics.record(tenant_id, 'insufficient')
+                raise InsufficientStock(failed)
+            # Stock was restored between the UPDATE and the check - try again
+            inventory_metrics.record(tenant_id, 'contention')
+        except OperationalError:
+            inventory_metrics.record(tenant_id, 'contention')
+            if attempt == max_retries:
+                raise
+        else:
+            inventory_metrics.record(tenant_id, 'committed')
+            catalog_cache.bump_on_commit(tenant_id)
+            return
+
+        inventory_metrics.record(tenant_id, 'retries')
+        time.sleep(backoff * 2 ** attempt)
+
+
+def increment_stock(quantities, tenant_id=None):
+    """
+    Put `quantities` (product id -> units) back into stock with one UPDATE.
+    Used when held or ordered units are released. Without a tenant_id the
+    caller is responsible for invalidating the affected catalogs.
+    """
+    if not quantities:
+        return 0
+
+    queryset = Product.objects.filter(id__in=quantities)
+    if tenant_id is not None:
+        queryset = queryset.filter(tenant_id=tenant_id)
+        catalog_cache.bump_on_commit(tenant_id)
+
+    return queryset.update(
+        stock_quantity=F('stock_quantity') + _quantity_case(quantities),
+        updated_at=timezone.now(),
+    )
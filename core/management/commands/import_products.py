@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import FORMATS, detect_format, import_products
+from core.models import Tenant, User
+from core.routers import use_tenant_database
+
+
+class Command(BaseCommand):
+    help = "Create or update a tenant's products from a CSV or JSONL file, matched on SKU"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file')
+        parser.add_argument('--tenant', required=True, help='Tenant id or subdomain')
+        parser.add_argument(
+            '--format', dest='input_format', choices=FORMATS, default=None,
+            help='Input format (default: from the file extension)'
+        )
+        parser.add_argument('--created-by', default=None, help='Username recorded as creator of new products')
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Rows validated and upserted per transaction (default: PRODUCT_IMPORT_CHUNK_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        lookup = {'id': options['tenant']} if options['tenant'].isdigit() else {'subdomain': options['tenant']}
+        tenant = Tenant.objects.filter(**lookup).first()
+        if tenant is None:
+            raise CommandError(f"Tenant {options['tenant']} does not exist")
+
+        created_by = None
+        if options['created_by']:
+            created_by = User.objects.using(tenant.db_alias).filter(
+                tenant=tenant, username=options['created_by']
+            ).first()
+            if created_by is None:
+                raise CommandError(f"User {options['created_by']} does not belong to {tenant.store_name}")
+
+        input_format = options['input_format'] or detect_format(filename=options['path'])
+        if input_format is None:
+            raise CommandError("Can't tell the input format from the file name, pass --format")
+
+        with open(options['path'], 'rb') as source, use_tenant_database(tenant.db_alias):
+            report = import_products(
+                tenant.id, source, input_format,
+                created_by=created_by, chunk_size=options['chunk_size']
+            )
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(
+            f"Created {report.created}, updated {report.updated}, {report.error_count} rows with errors"
+        )
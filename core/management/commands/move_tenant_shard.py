@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Tenant
+from core.sharding import MoveError, move_tenant
+
+
+class Command(BaseCommand):
+    help = "Move a tenant's users, products and orders to another database (tenant shard)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('tenant', help='Tenant id or subdomain')
+        parser.add_argument('database', help="Database alias from TENANT_SHARDS, or 'default'")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows copied per INSERT batch (default: 1000)'
+        )
+        parser.add_argument(
+            '--wait', type=float, default=None,
+            help='Seconds to wait for other processes to see the tenant change, '
+                 'before copying and before deleting (default: TENANT_CACHE_TTL)'
+        )
+
+    def handle(self, *args, **options):
+        lookup = {'id': options['tenant']} if options['tenant'].isdigit() else {'subdomain': options['tenant']}
+        tenant = Tenant.objects.filter(**lookup).first()
+        if tenant is None:
+            raise CommandError(f"Tenant {options['tenant']} does not exist")
+
+        source = tenant.db_alias
+        started = time.perf_counter()
+        try:
+            moved = move_tenant(
+                tenant, options['database'], batch_size=options['batch_size'],
+                wait=options['wait'], log=self.stdout.write
+            )
+        except MoveError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        for label, count in moved.items():
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(f"Moved {tenant.store_name} from {source} to {tenant.db_alias} in {elapsed:.2f}s")
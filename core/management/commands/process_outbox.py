@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send pending order events to the tenants\' webhooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of events claimed at a time (default: 100)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of delivery threads (default: OUTBOX_WORKERS)'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Keep running and send every INTERVAL seconds instead of exiting'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            counts = process_outbox(batch_size=options['batch_size'], workers=options['workers'])
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(
+                f"Delivered {counts['delivered']} events, {counts['retried']} to retry, "
+                f"{counts['failed']} failed in {elapsed:.2f}s"
+            )
+
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
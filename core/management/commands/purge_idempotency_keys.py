@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of keys deleted per query (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = purge_expired_keys(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys in {elapsed:.2f}s")
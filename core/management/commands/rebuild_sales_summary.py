@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.analytics import rebuild_sales_summary
+from core.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales summary tables from orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', default=None, help='Tenant id or subdomain (default: all tenants)')
+
+    def handle(self, *args, **options):
+        tenant_id = None
+        if options['tenant']:
+            lookup = {'id': options['tenant']} if options['tenant'].isdigit() else {'subdomain': options['tenant']}
+            tenant_id = Tenant.objects.filter(**lookup).values_list('id', flat=True).first()
+            if tenant_id is None:
+                raise CommandError(f"Tenant {options['tenant']} does not exist")
+
+        started = time.perf_counter()
+        days, product_days = rebuild_sales_summary(tenant_id)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Wrote {days} daily and {product_days} product-daily summary rows in {elapsed:.2f}s")
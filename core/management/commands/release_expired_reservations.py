@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release expired stock reservations and return their units to stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of reservations released per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Keep running and sweep every INTERVAL seconds instead of exiting'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            released = release_expired_reservations(batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(f"Released {released} expired reservations in {elapsed:.2f}s")
+
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
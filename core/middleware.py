@@ -1,47 +1,93 @@
 from django.utils.deprecation import MiddlewareMixin
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.permissions import SAFE_METHODS
+
+from .authentication import resolve_auth_context
+from .routers import (
+    is_pinned, pin_to_primary, replica_alias, reset_tenant_database, route_reads, set_tenant_database
+)
+from .tenants import tenant_host_map, tenant_registry
 
 
 class TenantMiddleware(MiddlewareMixin):
     """
     Middleware to extract tenant information from JWT token and attach it to the request.
     This ensures all requests are tenant-aware.
+
+    The token is decoded and verified once here and the result is stored as
+    `request.auth_context`, which TenantJWTAuthentication reuses instead of
+    verifying the signature a second time.
+
+    The storefront tenant of the Host header (subdomain or custom domain) is
+    resolved from an in-process table without queries and stored as
+    `request.host_tenant`; requests without a JWT get it as their tenant.
+
+    With tenant shards the tenant's database is routed to until the response
+    is returned (see core/routers.py).
     """
 
     def process_request(self, request):
-        # Skip tenant extraction for certain paths
-        exempt_paths = ['/admin/', '/api/auth/register/', '/api/auth/login/']
-        if any(request.path.startswith(path) for path in exempt_paths):
-            request.tenant_id = None
-            request.user_role = None
+        request.tenant_id = None
+        request.user_role = None
+        request.tenant = None
+        request.host_tenant = None
+
+        if request.path.startswith('/admin/'):
             return None
 
-        # Try to extract tenant from JWT token
-        jwt_auth = JWTAuthentication()
-        try:
-            # Get the token from the request
-            header = jwt_auth.get_header(request)
-            if header is None:
-                request.tenant_id = None
-                request.user_role = None
-                return None
-
-            raw_token = jwt_auth.get_raw_token(header)
-            if raw_token is None:
-                request.tenant_id = None
-                request.user_role = None
-                return None
-
-            # Validate and decode the token
-            validated_token = jwt_auth.get_validated_token(raw_token)
-
-            # Extract custom claims
-            request.tenant_id = validated_token.get('tenant_id')
-            request.user_role = validated_token.get('role')
-
-        except (InvalidToken, TokenError):
-            request.tenant_id = None
-            request.user_role = None
+        request.host_tenant = tenant_host_map.resolve(request.get_host())
+        request.tenant = request.host_tenant
+        request.tenant_id = request.host_tenant.id if request.host_tenant else None
+
+        # Skip JWT extraction for the login and registration endpoints
+        exempt_paths = ['/api/auth/register/', '/api/auth/login/']
+        if not any(request.path.startswith(path) for path in exempt_paths):
+            # Try to extract tenant from JWT token
+            context = resolve_auth_context(request)
+            request.auth_context = context
+
+            if context is not None and context.error is None:
+                # Extract custom claims
+                request.tenant_id = context.tenant_id
+                request.user_role = context.role
+                request.tenant = tenant_registry.get(context.tenant_id)
+
+        if request.tenant is not None:
+            request.tenant_db_token = set_tenant_database(request.tenant.db_alias)
 
         return None
+
+    def process_response(self, request, response):
+        token = getattr(request, 'tenant_db_token', None)
+        if token is not None:
+            reset_tenant_database(token)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Send the reads of safe-method requests to the read replica (see core/routers.py).
+    Other requests, and users pinned after a recent write, read from the primary.
+    A request that writes pins its user for REPLICA_PIN_SECONDS.
+
+    Must come after TenantMiddleware, which identifies the user from the JWT.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = replica_alias()
+        if alias is None:
+            return self.get_response(request)
+
+        context = getattr(request, 'auth_context', None)
+        user_id = context.user_id if context is not None else None
+        if request.method not in SAFE_METHODS or is_pinned(user_id):
+            alias = None
+
+        with route_reads(alias) as state:
+            response = self.get_response(request)
+
+        if state.wrote and user_id is not None:
+            pin_to_primary(user_id)
+        return response
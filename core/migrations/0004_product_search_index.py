@@ -0,0 +1,89 @@
+from django.db import migrations
+
+# Note: on SQLite, Django rebuilds a table to alter it, which drops its triggers.
+# Later migrations that alter the products table must recreate the triggers below.
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE products_fts USING fts5(
+        name, description, sku, tenant_id,
+        content='products', content_rowid='id', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, sku, tenant_id)
+        VALUES (new.id, new.name, new.description, new.sku, new.tenant_id);
+    END
+    """,
+    """
+    CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, sku, tenant_id)
+        VALUES ('delete', old.id, old.name, old.description, old.sku, old.tenant_id);
+    END
+    """,
+    # Only searchable columns - stock and price updates never touch the index
+    """
+    CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description, sku, tenant_id ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, sku, tenant_id)
+        VALUES ('delete', old.id, old.name, old.description, old.sku, old.tenant_id);
+        INSERT INTO products_fts(rowid, name, description, sku, tenant_id)
+        VALUES (new.id, new.name, new.description, new.sku, new.tenant_id);
+    END
+    """,
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS products_fts_update",
+    "DROP TRIGGER IF EXISTS products_fts_delete",
+    "DROP TRIGGER IF EXISTS products_fts_insert",
+    "DROP TABLE IF EXISTS products_fts",
+]
+
+# Must stay identical to PostgresSearchBackend.vector_sql for the planner to use it
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX products_search_idx ON products USING GIN (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || coalesce(sku, ''))
+    )
+    """,
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS products_search_idx",
+]
+
+
+def run_for_vendor(sqlite_statements, postgres_statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                if not cursor.fetchone()[0]:
+                    # No FTS5 in this SQLite build - search falls back to LIKE scans
+                    return
+            statements = sqlite_statements
+        elif vendor == 'postgresql':
+            statements = postgres_statements
+        else:
+            return
+
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD, POSTGRES_FORWARD),
+            run_for_vendor(SQLITE_REVERSE, POSTGRES_REVERSE),
+        ),
+    ]
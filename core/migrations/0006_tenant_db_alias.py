@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sales_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='db_alias',
+            field=models.CharField(default='default', max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-16 21:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_tenant_db_alias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='burst_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='rate_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
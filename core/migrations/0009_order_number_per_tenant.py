@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-16 21:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='order',
+            unique_together={('tenant', 'order_number')},
+        ),
+        migrations.CreateModel(
+            name='OrderNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_value', models.BigIntegerField(default=0)),
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='order_number_sequence', to='core.tenant')),
+            ],
+            options={
+                'db_table': 'order_number_sequences',
+            },
+        ),
+    ]
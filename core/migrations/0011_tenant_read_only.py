@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_order_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='is_read_only',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_tenant_read_only'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['tenant', 'status', 'id'], name='outbox_even_tenant__91046f_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -12,6 +14,17 @@ class Tenant(models.Model):
     contact_email = models.EmailField()
     contact_phone = models.CharField(max_length=20, blank=True)
     is_active = models.BooleanField(default=True)
+    # Writes are refused while set, e.g. while the tenant moves to another database (see core/sharding.py)
+    is_read_only = models.BooleanField(default=False)
+    # Database holding the tenant's users, products and orders (see core/routers.py)
+    db_alias = models.CharField(max_length=64, default='default')
+    # Requests per second and burst size (see core/throttling.py), empty for the settings defaults, 0 blocks the tenant
+    rate_limit = models.PositiveIntegerField(null=True, blank=True)
+    burst_limit = models.PositiveIntegerField(null=True, blank=True)
+    # Order events are POSTed here by the process_outbox command (see core/outbox.py),
+    # signed with HMAC-SHA256 of the secret when one is set
+    webhook_url = models.URLField(blank=True)
+    webhook_secret = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -52,6 +65,15 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.role}) - {self.tenant.store_name if self.tenant else 'No Tenant'}"
 
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        """Load all deferred fields together when one of them is accessed"""
+        if fields is not None:
+            fields = set(fields)
+            deferred_fields = self.get_deferred_fields()
+            if fields.intersection(deferred_fields):
+                fields = fields.union(deferred_fields)
+        super().refresh_from_db(using, fields, **kwargs)
+
 
 class Product(models.Model):
     """Product model - tenant-specific"""
@@ -88,6 +110,8 @@ class Product(models.Model):
         unique_together = [['tenant', 'sku']]
         indexes = [
             models.Index(fields=['tenant', 'is_active']),
+            # Keyset pagination (core/pagination.py)
+            models.Index(fields=['tenant', 'created_at', 'id']),
         ]
 
     def __str__(self):
@@ -105,6 +129,16 @@ class Order(models.Model):
         DELIVERED = 'DELIVERED', 'Delivered'
         CANCELLED = 'CANCELLED', 'Cancelled'
 
+    # Allowed status changes - anything else is rejected
+    TRANSITIONS = {
+        Status.PENDING: [Status.CONFIRMED, Status.CANCELLED],
+        Status.CONFIRMED: [Status.PROCESSING, Status.SHIPPED, Status.CANCELLED],
+        Status.PROCESSING: [Status.SHIPPED, Status.CANCELLED],
+        Status.SHIPPED: [Status.DELIVERED],
+        Status.DELIVERED: [],
+        Status.CANCELLED: [],
+    }
+
     tenant = models.ForeignKey(
         Tenant,
         on_delete=models.CASCADE,
@@ -115,7 +149,8 @@ class Order(models.Model):
         on_delete=models.CASCADE,
         related_name='orders'
     )
-    order_number = models.CharField(max_length=50, unique=True)
+    # Unique per tenant, handed out by core/ordernumbers.py
+    order_number = models.CharField(max_length=50)
     status = models.CharField(
         max_length=20,
         choices=Status.choices,
@@ -134,14 +169,26 @@ class Order(models.Model):
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        unique_together = [['tenant', 'order_number']]
         indexes = [
             models.Index(fields=['tenant', 'customer']),
             models.Index(fields=['tenant', 'status']),
+            # Keyset pagination (core/pagination.py)
+            models.Index(fields=['tenant', 'created_at', 'id']),
         ]
 
     def __str__(self):
         return f"Order {self.order_number} - {self.tenant.store_name}"
 
+    @classmethod
+    def can_transition(cls, current, new):
+        return new in cls.TRANSITIONS.get(current, [])
+
+    @classmethod
+    def statuses_leading_to(cls, new):
+        """Statuses an order may move to `new` from"""
+        return [current for current, targets in cls.TRANSITIONS.items() if new in targets]
+
 
 class OrderItem(models.Model):
     """Order item model - links products to orders"""
@@ -180,3 +227,205 @@ class OrderItem(models.Model):
         """Calculate subtotal before saving"""
         self.subtotal = self.price_at_order * self.quantity
         super().save(*args, **kwargs)
+
+
+class StockReservation(models.Model):
+    """
+    Units of a product held for a customer's cart until expires_at.
+    Held units are already taken out of Product.stock_quantity; they go back
+    when the hold is released or expires, or become an order when confirmed.
+    """
+
+    class Status(models.TextChoices):
+        HELD = 'HELD', 'Held'
+        CONFIRMED = 'CONFIRMED', 'Confirmed'
+        RELEASED = 'RELEASED', 'Released'
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    customer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    quantity = models.IntegerField(
+        validators=[MinValueValidator(1)]
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.HELD
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservations'
+    )
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'stock_reservations'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['tenant', 'customer', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} held for {self.customer_id} ({self.status})"
+
+
+class OrderNumberSequence(models.Model):
+    """Last order number handed out for a tenant, see core/ordernumbers.py"""
+    tenant = models.OneToOneField(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='order_number_sequence'
+    )
+    last_value = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'order_number_sequences'
+
+    def __str__(self):
+        return f"{self.tenant_id}: {self.last_value}"
+
+
+class DailySales(models.Model):
+    """Per-tenant daily totals of non-cancelled orders, maintained by core/analytics.py"""
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+    date = models.DateField()
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_sales'
+        ordering = ['-date']
+        unique_together = [['tenant', 'date']]
+
+    def __str__(self):
+        return f"{self.date} - {self.tenant.store_name}: {self.revenue}"
+
+
+class ProductDailySales(models.Model):
+    """Per-tenant daily totals of each product in non-cancelled orders, maintained by core/analytics.py"""
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='product_daily_sales'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+    date = models.DateField()
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'product_daily_sales'
+        ordering = ['-date']
+        unique_together = [['tenant', 'product', 'date']]
+        indexes = [
+            models.Index(fields=['tenant', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product.name}: {self.units} units"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's Idempotency-Key and the response it got, see core/idempotency.py.
+    Rows without a status_code are claimed by a request still running.
+    """
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    # SHA-256 of the method, path and body of the request that used the key
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    locked_until = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        ordering = ['-created_at']
+        unique_together = [['tenant', 'user', 'key']]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.key} of {self.user_id} ({self.status_code or 'in progress'})"
+
+
+class OutboxEvent(models.Model):
+    """
+    Order event waiting to be sent to the tenant's webhook. Written in the
+    transaction that changes the order and sent by core/outbox.py.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        DELIVERED = 'DELIVERED', 'Delivered'
+        FAILED = 'FAILED', 'Failed'
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='outbox_events'
+    )
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'outbox_events'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            # Oldest pending event of a tenant, see core.outbox._claim
+            models.Index(fields=['tenant', 'status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id} ({self.status})"
@@ -0,0 +1,128 @@
+"""
+Order number generators, picked by settings.ORDER_NUMBER_GENERATOR.
+
+SequenceOrderNumberGenerator (default): per-tenant increasing numbers,
+ORD-0000000042. Each process takes ORDER_NUMBER_BLOCK_SIZE numbers at a
+time from the tenant's OrderNumberSequence row, so the row is updated once
+per block instead of once per order, and new orders land at the end of the
+(tenant, order_number) index. Numbers are unique but can have gaps: blocks
+not used up when a process exits are lost. A block taken inside a
+transaction is only shared with other requests once that transaction
+commits - if it rolls back, the sequence row does too and the numbers
+would be handed out again.
+
+TimeOrderedOrderNumberGenerator: ORD- and 16 characters encoding the
+time in milliseconds and 32 random bits, no database access.
+
+Both have 10+ characters after ORD-, so they never match the 8-character
+numbers of older orders.
+"""
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import OrderNumberSequence
+from .routers import db_for_tenant
+
+
+class OrderNumberGenerator:
+    """Base class: next_number(tenant_id) returns an order number not used by the tenant"""
+
+    def next_number(self, tenant_id):
+        raise NotImplementedError
+
+    def clear(self):
+        """Forget any in-process state"""
+
+
+class SequenceOrderNumberGenerator(OrderNumberGenerator):
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._blocks = {}  # tenant id -> [next value, last value]
+        self._lock = threading.Lock()
+
+    def next_number(self, tenant_id):
+        with self._lock:
+            block = self._blocks.get(tenant_id)
+            if block is not None and block[0] <= block[1]:
+                value = block[0]
+                block[0] += 1
+                return self.format(value)
+
+        first, last = self.allocate(tenant_id, self.block_size or settings.ORDER_NUMBER_BLOCK_SIZE)
+        rest = [first + 1, last]
+        using = db_for_tenant(tenant_id)
+        if connections[using].in_atomic_block:
+            transaction.on_commit(lambda: self._share(tenant_id, rest), using=using)
+        else:
+            self._share(tenant_id, rest)
+        return self.format(first)
+
+    def _share(self, tenant_id, block):
+        if block[0] <= block[1]:
+            with self._lock:
+                self._blocks[tenant_id] = block
+
+    def allocate(self, tenant_id, size):
+        """Reserve `size` numbers of the tenant. Returns (first, last)."""
+        using = db_for_tenant(tenant_id)
+        # Explicit alias: callers outside requests have no tenant database routed
+        sequence = OrderNumberSequence.objects.using(using).filter(tenant_id=tenant_id)
+        with transaction.atomic(using=using):
+            if not sequence.update(last_value=F('last_value') + size):
+                try:
+                    with transaction.atomic(using=using):
+                        sequence.create(tenant_id=tenant_id, last_value=size)
+                    return 1, size
+                except IntegrityError:
+                    # Created by a concurrent request
+                    sequence.update(last_value=F('last_value') + size)
+            last = sequence.values_list('last_value', flat=True).get()
+        return last - size + 1, last
+
+    def format(self, value):
+        return f"ORD-{value:010d}"
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+class TimeOrderedOrderNumberGenerator(OrderNumberGenerator):
+    # Crockford's base32: no I, L, O or U
+    ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next_number(self, tenant_id):
+        value = (time.time_ns() // 1_000_000) << 32 | secrets.randbits(32)
+        with self._lock:
+            # Increasing within the process even if the clock steps back
+            value = max(value, self._last + 1)
+            self._last = value
+
+        chars = []
+        for _ in range(16):
+            value, digit = divmod(value, 32)
+            chars.append(self.ALPHABET[digit])
+        return 'ORD-' + ''.join(reversed(chars))
+
+
+_generators = {}
+
+
+def get_generator():
+    """The instance of settings.ORDER_NUMBER_GENERATOR, shared by the process"""
+    path = settings.ORDER_NUMBER_GENERATOR
+    generator = _generators.get(path)
+    if generator is None:
+        generator = _generators.setdefault(path, import_string(path)())
+    return generator
@@ -0,0 +1,227 @@
+"""
+Transactional outbox for order events.
+
+record_order_created and record_status_changes add OutboxEvent rows in the
+transaction that changes the orders, so an event exists if and only if its
+change was committed. Tenants without a webhook_url get no events.
+
+process_outbox (the process_outbox command) sends pending events as JSON
+POSTs to each tenant's webhook_url. Events are claimed in batches, a
+tenant's events always from its oldest pending one on, and only by one
+worker at a time: a tenant whose oldest pending event is backing off or
+claimed elsewhere is skipped, so every tenant gets its events strictly in
+order. Each tenant's events of a batch are sent by one thread of a pool of
+OUTBOX_WORKERS threads, which only do HTTP - the database is read and
+written by the calling thread. Failed deliveries are retried after
+OUTBOX_RETRY_BACKOFF seconds, doubled after every attempt, and given up
+after OUTBOX_MAX_ATTEMPTS. Delivery is at least once: receivers should
+ignore event ids they have already seen.
+"""
+import hashlib
+import hmac
+import json
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .routers import db_for_tenant, tenant_databases
+from .tenants import tenant_registry
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+
+
+def _has_webhook(tenant_id):
+    tenant = tenant_registry.get(tenant_id)
+    return tenant is not None and bool(tenant.webhook_url)
+
+
+def record_order_created(order):
+    """Add an order.created event. Call in the transaction creating the order."""
+    if not _has_webhook(order.tenant_id):
+        return
+    OutboxEvent.objects.using(db_for_tenant(order.tenant_id)).create(
+        tenant_id=order.tenant_id,
+        event_type=ORDER_CREATED,
+        payload={'order': {
+            'id': order.id,
+            'order_number': order.order_number,
+            'status': order.status,
+            'customer': order.customer_id,
+            'total_amount': order.total_amount,
+            'created_at': order.created_at,
+        }},
+    )
+
+
+def record_status_changes(tenant_id, previous, status):
+    """
+    Add an order.status_changed event per order, with one INSERT. `previous`
+    maps order id -> status before the change. Call in the transaction
+    changing the orders.
+    """
+    if not previous or not _has_webhook(tenant_id):
+        return
+    OutboxEvent.objects.using(db_for_tenant(tenant_id)).bulk_create([
+        OutboxEvent(
+            tenant_id=tenant_id,
+            event_type=ORDER_STATUS_CHANGED,
+            payload={'order': {'id': pk, 'status': status, 'previous_status': previous_status}},
+        )
+        for pk, previous_status in sorted(previous.items())
+    ])
+
+
+def send_event(tenant, event):
+    """POST the event to the tenant's webhook. Returns None when delivered, else the error."""
+    body = json.dumps({
+        'id': event.id,
+        'type': event.event_type,
+        'created_at': event.created_at,
+        'data': event.payload,
+    }, cls=DjangoJSONEncoder).encode()
+    headers = {'Content-Type': 'application/json', 'X-Webhook-Event': event.event_type}
+    if tenant.webhook_secret:
+        digest = hmac.new(tenant.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        headers['X-Webhook-Signature'] = f'sha256={digest}'
+
+    request = urllib.request.Request(tenant.webhook_url, data=body, headers=headers, method='POST')
+    try:
+        # Non-2xx responses raise HTTPError
+        with urllib.request.urlopen(request, timeout=settings.OUTBOX_WEBHOOK_TIMEOUT) as response:
+            response.read()
+    except (OSError, ValueError) as e:
+        return str(e) or e.__class__.__name__
+    return None
+
+
+def _send_in_order(tenant, events):
+    """Send one tenant's events until one fails. Returns (delivered, failed event, error)."""
+    delivered = []
+    for event in events:
+        error = send_event(tenant, event)
+        if error is not None:
+            return delivered, event, error
+        delivered.append(event)
+    return delivered, None, None
+
+
+def _claim(using, batch_size, now):
+    """
+    Take due events for OUTBOX_CLAIM_SECONDS so other workers skip them.
+
+    Tenants are claimed through their oldest pending event (the head of
+    their queue), with an UPDATE conditional on it being unchanged, so only
+    one worker wins a tenant even without row locks. The winner then takes
+    the tenant's due events that follow the head, up to batch_size.
+    """
+    outbox = OutboxEvent.objects.using(using)
+    pending = outbox.filter(status=OutboxEvent.Status.PENDING)
+    claimed_until = now + timedelta(seconds=settings.OUTBOX_CLAIM_SECONDS)
+
+    oldest = pending.filter(tenant_id=OuterRef('tenant_id')).order_by('id').values('id')[:1]
+    heads = list(
+        pending
+        .filter(next_attempt_at__lte=now, id=Subquery(oldest))
+        .order_by('id')[:batch_size]
+    )
+
+    events = []
+    followers = []
+    with transaction.atomic(using=using):
+        for head in heads:
+            if len(events) >= batch_size:
+                break
+            won = pending.filter(id=head.id, next_attempt_at=head.next_attempt_at).update(
+                next_attempt_at=claimed_until
+            )
+            if not won:
+                # Another worker claimed the tenant since it was read
+                continue
+            events.append(head)
+
+            # The due events right after the head; a later one not due yet ends the run
+            for event in pending.filter(tenant_id=head.tenant_id, id__gt=head.id).order_by('id')[:batch_size - 1]:
+                if event.next_attempt_at > now:
+                    break
+                events.append(event)
+                followers.append(event.id)
+
+        if followers:
+            outbox.filter(id__in=followers).update(next_attempt_at=claimed_until)
+    return events
+
+
+def _retry_at(attempts, now):
+    backoff = settings.OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return now + timedelta(seconds=min(backoff, settings.OUTBOX_RETRY_MAX_BACKOFF))
+
+
+def process_outbox(batch_size=100, workers=None, now=None):
+    """Send the due events of every tenant database. Returns a Counter of delivered, retried and failed events."""
+    now = now or timezone.now()
+    counts = Counter()
+    with ThreadPoolExecutor(max_workers=workers or settings.OUTBOX_WORKERS) as pool:
+        for alias in tenant_databases():
+            while True:
+                events = _claim(alias, batch_size, now)
+                if not events:
+                    break
+                _send_batch(alias, events, pool, now, counts)
+    return counts
+
+
+def _send_batch(using, events, pool, now, counts):
+    by_tenant = defaultdict(list)
+    for event in events:
+        by_tenant[event.tenant_id].append(event)
+
+    outbox = OutboxEvent.objects.using(using)
+    futures = []
+    for tenant_id, tenant_events in by_tenant.items():
+        tenant = tenant_registry.get(tenant_id)
+        if tenant is None or not tenant.webhook_url:
+            outbox.filter(id__in=[event.id for event in tenant_events]).update(
+                status=OutboxEvent.Status.FAILED, last_error='The tenant has no webhook_url'
+            )
+            counts['failed'] += len(tenant_events)
+            continue
+        futures.append((tenant_events, pool.submit(_send_in_order, tenant, tenant_events)))
+
+    for tenant_events, future in futures:
+        delivered, failed, error = future.result()
+        if delivered:
+            outbox.filter(id__in=[event.id for event in delivered]).update(
+                status=OutboxEvent.Status.DELIVERED, delivered_at=timezone.now(),
+                attempts=F('attempts') + 1, last_error=''
+            )
+            counts['delivered'] += len(delivered)
+        if failed is None:
+            continue
+
+        attempts = failed.attempts + 1
+        if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            outbox.filter(id=failed.id).update(
+                status=OutboxEvent.Status.FAILED, attempts=attempts, last_error=error
+            )
+            counts['failed'] += 1
+            # Given up: the next events can go right away
+            retry_at = now
+        else:
+            retry_at = _retry_at(attempts, now)
+            outbox.filter(id=failed.id).update(attempts=attempts, next_attempt_at=retry_at, last_error=error)
+            counts['retried'] += 1
+
+        # Later events of the tenant wait for the failed one, keeping their order;
+        # until then the failed one keeps the tenant from being claimed
+        unsent = [event.id for event in tenant_events[len(delivered) + 1:]]
+        if unsent:
+            outbox.filter(id__in=unsent).update(next_attempt_at=retry_at)
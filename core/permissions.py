@@ -1,19 +1,29 @@
 from rest_framework import permissions
 from .models import User
+from .tenants import tenant_registry
 
 
 class IsTenantUser(permissions.BasePermission):
     """
     Permission to check if user belongs to the same tenant as the resource.
+    The user's tenant must exist and be active, and not read-only for writes.
     """
 
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.tenant is not None
+        if not request.user or not request.user.is_authenticated:
+            return False
+        tenant = tenant_registry.get(request.user.tenant_id)
+        if tenant is None or not tenant.is_active:
+            return False
+        if tenant.is_read_only and request.method not in permissions.SAFE_METHODS:
+            self.message = 'The store is read-only for maintenance, please try again shortly.'
+            return False
+        return True
 
     def has_object_permission(self, request, view, obj):
         # Check if the object has a tenant attribute
-        if hasattr(obj, 'tenant'):
-            return obj.tenant == request.user.tenant
+        if hasattr(obj, 'tenant_id'):
+            return obj.tenant_id == request.user.tenant_id
         return False
 
 
@@ -81,7 +91,7 @@ class TenantProductPermission(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Ensure object belongs to same tenant
-        if obj.tenant != request.user.tenant:
+        if obj.tenant_id != request.user.tenant_id:
             return False
 
         if request.user.role == User.Role.STORE_OWNER:
@@ -118,7 +128,7 @@ class TenantOrderPermission(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Ensure object belongs to same tenant
-        if obj.tenant != request.user.tenant:
+        if obj.tenant_id != request.user.tenant_id:
             return False
 
         if request.user.role == User.Role.STORE_OWNER:
@@ -129,6 +139,6 @@ class TenantOrderPermission(permissions.BasePermission):
 
         if request.user.role == User.Role.CUSTOMER:
             # Customers can only access their own orders
-            return obj.customer == request.user
+            return obj.customer_id == request.user.id
 
         return False
@@ -0,0 +1,154 @@
+"""
+High-throughput rendering for large list pages, enabled with FAST_RENDERING.
+
+ValuesSerializer reads rows with values() and builds plain dicts with
+one precomputed converter per field, instead of loading model instances and
+walking DRF field objects row by row. FastJSONRenderer encodes with orjson
+when it is installed and falls back to DRF's encoder otherwise. Both produce
+the same JSON as the regular ModelSerializer + JSONRenderer path.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer on orjson - output matches DRF's compact UTF-8 rendering"""
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # orjson has native datetimes, but in a different format than DRF - let DRF's encoder do them
+        try:
+            ret = orjson.dumps(data, default=self.encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            # e.g. integers over 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping as JSONRenderer, so the output can be embedded in JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format != 'iso-8601' or hasattr(field, 'timezone'):
+        return field.to_representation
+    if not settings.USE_TZ:
+        return lambda value: value.isoformat()
+
+    def to_representation(value):
+        value = value.astimezone(timezone.get_current_timezone()).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return to_representation
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+    quantum = Decimal(1).scaleb(-field.decimal_places)
+    return lambda value: format(value.quantize(quantum), 'f')
+
+
+def _field_converter(field):
+    """
+    Converter for one serializer field, None for values that are already
+    JSON-ready, or raises TypeError if the field can't be read from values().
+    """
+    if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField,
+                          serializers.SerializerMethodField)) or field.source == '*':
+        raise TypeError(f"{field.field_name} can't be read with values()")
+
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                          serializers.ChoiceField, serializers.PrimaryKeyRelatedField)):
+        # Database values come back as str / int / bool already
+        return None
+    # Any other read-only field that takes the plain column value (e.g. TenantNameField)
+    return field.to_representation
+
+
+class ValuesSerializer:
+    """
+    Compiled, read-only form of a serializer instance for flat rows.
+
+    Every field is mapped to a values() path ('created_by.username' becomes
+    'created_by__username') and a converter. `queryset(qs)` returns the
+    values() queryset to paginate; its rows are dicts that also carry `id`
+    and `created_at` for KeysetPagination. `to_representation(rows)` turns
+    them into the serializer's output.
+    """
+    key_columns = ('id', 'created_at')
+
+    def __init__(self, serializer):
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            self.fields.append((name, '__'.join(field.source_attrs), _field_converter(field)))
+
+    @classmethod
+    def compile(cls, serializer):
+        """ValuesSerializer for the serializer, or None if it has fields values() can't provide"""
+        try:
+            return cls(serializer)
+        except TypeError:
+            return None
+
+    def queryset(self, queryset):
+        columns = list(dict.fromkeys([column for _, column, _ in self.fields] + list(self.key_columns)))
+        # Keep extra selects (e.g. the search rank) so ordering by them still works
+        columns += [name for name in queryset.query.extra if name not in columns]
+        return queryset.values(*columns)
+
+    def to_representation(self, rows):
+        fields = self.fields
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in fields:
+                value = row[column]
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
+
+
+class FastListMixin:
+    """
+    Render list pages through ValuesSerializer when settings.FAST_RENDERING is on.
+    Serializers with nested or computed fields keep the regular path.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_RENDERING', False):
+            return super().list(request, *args, **kwargs)
+
+        compiled = ValuesSerializer.compile(self.get_serializer())
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = compiled.queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.to_representation(page))
+        return Response(compiled.to_representation(queryset))
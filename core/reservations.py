@@ -0,0 +1,145 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .caching import catalog_cache
+from .inventory import decrement_stock, increment_stock, InsufficientStock
+from .models import Product, StockReservation
+from .routers import db_for_tenant, tenant_databases, use_tenant_database
+from .services import create_order_with_items
+
+
+def reserve_stock(tenant_id, customer, product_id, quantity, ttl_seconds=None):
+    """
+    Hold `quantity` units of a product for the customer for `ttl_seconds`.
+    The units are taken out of stock straight away so the hold can later be
+    confirmed without locking the product row.
+    """
+    if ttl_seconds is None:
+        ttl_seconds = settings.RESERVATION_TTL
+
+    with transaction.atomic(using=db_for_tenant(tenant_id)):
+        product = Product.objects.filter(tenant_id=tenant_id, is_active=True, id=product_id).first()
+        if product is None:
+            raise ValidationError({'product': [f"Product {product_id} is not available"]})
+
+        try:
+            decrement_stock(tenant_id, {product_id: quantity})
+        except InsufficientStock:
+            raise ValidationError({'quantity': [f"Insufficient stock for {product.name}"]})
+
+        return StockReservation.objects.create(
+            tenant_id=tenant_id,
+            product=product,
+            customer=customer,
+            quantity=quantity,
+            expires_at=timezone.now() + timedelta(seconds=ttl_seconds),
+        )
+
+
+def release_reservation(reservation):
+    """Give a held reservation's units back to stock. Returns False if it was no longer held."""
+    with transaction.atomic(using=db_for_tenant(reservation.tenant_id)):
+        released = StockReservation.objects.filter(
+            id=reservation.id,
+            status=StockReservation.Status.HELD,
+        ).update(status=StockReservation.Status.RELEASED, updated_at=timezone.now())
+
+        if released:
+            increment_stock({reservation.product_id: reservation.quantity}, reservation.tenant_id)
+
+    return bool(released)
+
+
+def confirm_reservations(tenant_id, customer, reservation_ids, order_number, **order_fields):
+    """
+    Turn the customer's unexpired holds into an order.
+    Stock was taken when the holds were made, so no product rows are written here.
+    """
+    reservation_ids = set(reservation_ids)
+    now = timezone.now()
+
+    with transaction.atomic(using=db_for_tenant(tenant_id)):
+        reservations = list(
+            StockReservation.objects
+            .select_related('product')
+            .filter(
+                id__in=reservation_ids,
+                tenant_id=tenant_id,
+                customer=customer,
+                status=StockReservation.Status.HELD,
+                expires_at__gt=now,
+            )
+        )
+        found = {reservation.id for reservation in reservations}
+        if found != reservation_ids:
+            raise ValidationError({'reservations': [
+                f"Reservation {pk} is expired or no longer held" for pk in sorted(reservation_ids - found)
+            ]})
+
+        products = {reservation.product_id: reservation.product for reservation in reservations}
+        items = [
+            {'product_id': reservation.product_id, 'quantity': reservation.quantity}
+            for reservation in reservations
+        ]
+        order = create_order_with_items(tenant_id, customer, order_number, products, items, **order_fields)
+
+        # Conditional claim - a concurrent sweep or confirm makes this fail and rolls back the order
+        claimed = StockReservation.objects.filter(
+            id__in=found,
+            status=StockReservation.Status.HELD,
+        ).update(status=StockReservation.Status.CONFIRMED, order=order, updated_at=now)
+        if claimed != len(found):
+            raise ValidationError({'reservations': ["Reservations changed while confirming, please retry"]})
+
+    return order
+
+
+def release_expired_reservations(batch_size=1000, now=None):
+    """
+    Release expired holds in batches and give their units back to stock.
+    Each batch is one transaction: one SELECT, one UPDATE of the holds
+    and one UPDATE of the affected products. Returns the number released.
+    With tenant shards every tenant database is swept in turn.
+    """
+    now = now or timezone.now()
+    total = 0
+    for alias in tenant_databases():
+        with use_tenant_database(alias):
+            total += _release_expired(alias, batch_size, now)
+    return total
+
+
+def _release_expired(using, batch_size, now):
+    total = 0
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(
+                StockReservation.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=StockReservation.Status.HELD, expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', 'tenant_id', 'product_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                return total
+
+            # The rows stay locked until commit: a concurrent confirm or release
+            # waits for it and then finds them no longer HELD
+            StockReservation.objects.filter(
+                id__in=[pk for pk, _, _, _ in batch],
+            ).update(status=StockReservation.Status.RELEASED, updated_at=timezone.now())
+
+            quantities = Counter()
+            for _, _, product_id, quantity in batch:
+                quantities[product_id] += quantity
+            increment_stock(dict(quantities))
+
+            for tenant_id in {tenant_id for _, tenant_id, _, _ in batch}:
+                catalog_cache.bump_on_commit(tenant_id)
+
+        total += len(batch)
@@ -0,0 +1,186 @@
+"""
+Database routing: tenant shards and the read replica.
+
+Shards: with TENANT_SHARDS set, the rows of each tenant live in the
+database named by Tenant.db_alias. TenantMiddleware puts the alias of the
+request's tenant in a context variable and TenantShardRouter sends every
+query on tenant-owned models there. The default database keeps the tenant
+directory (the tenants table) and the data of tenants not moved elsewhere;
+shards hold copies of their tenants' rows only so foreign keys work.
+
+Replica: reads of safe-method API requests (GET, HEAD, OPTIONS) go to the
+database alias settings.READ_REPLICA_ALIAS; writes always go to the primary.
+ReplicaRoutingMiddleware picks the alias per request and keeps it in a
+context variable, so code running outside a request (management commands,
+workers, shell) keeps reading from the primary. The replica mirrors the
+default database only.
+
+Read-your-writes: once a request has written, its remaining reads go to the
+primary, and the user who wrote is pinned to the primary for
+REPLICA_PIN_SECONDS so replica lag never hides their own changes.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Tenant
+from .tenants import tenant_registry
+
+_tenant_db = contextvars.ContextVar('tenant_db_alias', default=None)
+
+
+def sharding_enabled():
+    return bool(getattr(settings, 'TENANT_SHARDS', None))
+
+
+def tenant_databases():
+    """Aliases that can hold tenant data: default and the TENANT_SHARDS"""
+    return [DEFAULT_DB_ALIAS, *getattr(settings, 'TENANT_SHARDS', ())]
+
+
+def db_for_tenant(tenant_id):
+    """Alias of the database holding the tenant's rows"""
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    tenant = tenant_registry.get(tenant_id)
+    return tenant.db_alias if tenant is not None else DEFAULT_DB_ALIAS
+
+
+def set_tenant_database(alias):
+    """Route tenant-owned models to `alias` (None: default routing). Returns a token for reset_tenant_database."""
+    return _tenant_db.set(alias)
+
+
+def reset_tenant_database(token):
+    _tenant_db.reset(token)
+
+
+@contextmanager
+def use_tenant_database(alias):
+    """Route tenant-owned models to `alias` inside the block, e.g. in management commands"""
+    token = set_tenant_database(alias)
+    try:
+        yield
+    finally:
+        reset_tenant_database(token)
+
+
+class TenantShardRouter:
+    """
+    Route tenant-owned models (every core model but Tenant) to the database
+    of their tenant: the tenant of the instance involved when there is one,
+    else the one set by TenantMiddleware or use_tenant_database.
+    Tenant rows are read from the default database. For tenants on the
+    default database it returns None and leaves the choice to ReplicaRouter.
+    """
+
+    def _tenant_db(self, model, hints):
+        if not sharding_enabled() or model._meta.app_label != Tenant._meta.app_label:
+            return None
+
+        instance = hints.get('instance')
+        if isinstance(instance, Tenant):
+            alias = instance.db_alias
+        elif getattr(instance, 'tenant_id', None) is not None:
+            alias = db_for_tenant(instance.tenant_id)
+        else:
+            alias = _tenant_db.get()
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_read(self, model, **hints):
+        if model is Tenant:
+            # Not the copy on the shard a related instance came from
+            return DEFAULT_DB_ALIAS if sharding_enabled() and hints.get('instance') is not None else None
+        return self._tenant_db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        if model is Tenant:
+            return None
+        return self._tenant_db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = set(tenant_databases())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class _RoutingState:
+    __slots__ = ['read_alias', 'wrote']
+
+    def __init__(self, read_alias):
+        self.read_alias = read_alias
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, None when there is none"""
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    return alias if alias and alias in connections.settings else None
+
+
+@contextmanager
+def route_reads(alias):
+    """Send reads to `alias` (None: the primary) until the block exits or something is written"""
+    token = _state.set(_RoutingState(alias))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+def reading_from_replica():
+    """True while reads of the current request go to the replica"""
+    state = _state.get()
+    return state is not None and state.read_alias is not None and not state.wrote
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Keep the user's reads on the primary for REPLICA_PIN_SECONDS"""
+    cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(_pin_key(user_id)) is not None
+
+
+class ReplicaRouter:
+    """Send the reads chosen by route_reads to the replica"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.read_alias is None:
+            return None
+        if state.wrote:
+            return DEFAULT_DB_ALIAS
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        # Also for instances read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db == getattr(settings, 'READ_REPLICA_ALIAS', None):
+            return False
+        return None
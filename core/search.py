@@ -0,0 +1,113 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+# Words of the user's query; everything else is dropped so it can't break the query syntax
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class BasicSearchBackend:
+    """Unindexed LIKE '%term%' scan - used when the database has no full-text support"""
+
+    def search(self, queryset, query, tenant_id):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(sku__icontains=query)
+        )
+
+
+class SQLiteFTSBackend:
+    """
+    SQLite FTS5 search over the products_fts external-content table.
+    Triggers created in migration 0004 keep it in sync with products.
+    The tenant id is an indexed FTS column, so matching is confined to one
+    tenant inside the index. Every word is matched as a prefix and results
+    are ranked with bm25 (name weighs most, then SKU, then description).
+    """
+    table = 'products_fts'
+    rank_sql = 'bm25(products_fts, 10.0, 1.0, 5.0, 0.0)'
+
+    def search(self, queryset, query, tenant_id):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+
+        terms = ' '.join(f'"{token}"*' for token in tokens)
+        match = f'tenant_id : "{int(tenant_id)}" AND {{name description sku}} : ({terms})'
+
+        # The unary + keeps SQLite from probing the FTS table by rowid once per
+        # product (one full MATCH per row); the MATCH runs once as the outer loop
+        return queryset.extra(
+            select={'search_rank': self.rank_sql},
+            tables=[self.table],
+            where=[f'products.id = +{self.table}.rowid', f'{self.table} MATCH %s'],
+            params=[match],
+        ).order_by('search_rank', '-id')
+
+
+class PostgresSearchBackend:
+    """
+    PostgreSQL tsvector search. The expression matches the GIN index created
+    in migration 0004, so the planner can use it. Words are matched as
+    prefixes and results are ranked with ts_rank.
+    """
+    vector_sql = (
+        "to_tsvector('simple', coalesce(products.name, '') || ' ' || "
+        "coalesce(products.description, '') || ' ' || coalesce(products.sku, ''))"
+    )
+
+    def search(self, queryset, query, tenant_id):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+
+        tsquery = ' & '.join(f"{token}:*" for token in tokens)
+        return queryset.extra(
+            select={'search_rank': f"-ts_rank({self.vector_sql}, to_tsquery('simple', %s))"},
+            select_params=[tsquery],
+            where=[f"{self.vector_sql} @@ to_tsquery('simple', %s)"],
+            params=[tsquery],
+        ).order_by('search_rank', '-id')
+
+
+_backends = {}
+
+
+def get_search_backend(using):
+    """Search backend for a database alias - settings.PRODUCT_SEARCH_BACKEND overrides detection"""
+    if using not in _backends:
+        backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        if backend_path:
+            backend = import_string(backend_path)()
+        else:
+            connection = connections[using]
+            if connection.vendor == 'postgresql':
+                backend = PostgresSearchBackend()
+            elif connection.vendor == 'sqlite' and SQLiteFTSBackend.table in connection.introspection.table_names():
+                backend = SQLiteFTSBackend()
+            else:
+                backend = BasicSearchBackend()
+        _backends[using] = backend
+    return _backends[using]
+
+
+def search_products(queryset, query, tenant_id):
+    """
+    Narrow a tenant's product queryset to `query`, best match first.
+    An exact SKU is answered from the (tenant, sku) unique index without
+    touching the search index.
+    """
+    query = query.strip()
+    exact = queryset.filter(sku=query).values_list('id', flat=True).first()
+    if exact is not None:
+        return queryset.filter(id=exact)
+
+    return get_search_backend(queryset.db).search(queryset, query, tenant_id)
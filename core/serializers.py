@@ -1,29 +1,55 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.password_validation import validate_password
-from .models import Tenant, User, Product, Order, OrderItem
+from .fieldsets import SparseFieldsetMixin
+from .models import Tenant, User, Product, Order, OrderItem, StockReservation, DailySales
+from .reservations import reserve_stock
+from .services import change_order_status, place_order
+from .tenants import tenant_registry
+
+
+class TenantNameField(serializers.Field):
+    """Read-only store name of the object's tenant, resolved through the tenant registry"""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'tenant_id'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        tenant = tenant_registry.get(value)
+        return tenant.store_name if tenant else None
 
 
 class TenantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tenant
-        fields = ['id', 'store_name', 'domain', 'subdomain', 'contact_email', 'contact_phone', 'is_active', 'created_at']
+        fields = [
+            'id', 'store_name', 'domain', 'subdomain', 'contact_email', 'contact_phone', 'is_active', 'created_at'
+        ]
         read_only_fields = ['id', 'created_at']
 
 
 class UserSerializer(serializers.ModelSerializer):
-    tenant_name = serializers.CharField(source='tenant.store_name', read_only=True)
+    tenant_name = TenantNameField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'tenant', 'tenant_name', 'role', 'phone', 'date_joined']
+        fields = [
+            'id', 'username', 'email', 'first_name', 'last_name', 'tenant', 'tenant_name', 'role', 'phone',
+            'date_joined'
+        ]
         read_only_fields = ['id', 'date_joined']
 
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
-    tenant = serializers.PrimaryKeyRelatedField(queryset=Tenant.objects.filter(is_active=True))
+    tenant = serializers.PrimaryKeyRelatedField(queryset=Tenant.objects.filter(is_active=True, is_read_only=False))
 
     class Meta:
         model = User
@@ -46,8 +72,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
 
         # Add custom claims
-        token['tenant_id'] = user.tenant.id if user.tenant else None
+        token['tenant_id'] = user.tenant_id
         token['role'] = user.role
+        token['is_active'] = user.is_active
         token['username'] = user.username
         token['email'] = user.email
 
@@ -57,21 +84,22 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         data = super().validate(attrs)
 
         # Add extra user info to response
+        tenant = tenant_registry.get(self.user.tenant_id)
         data['user'] = {
             'id': self.user.id,
             'username': self.user.username,
             'email': self.user.email,
-            'tenant_id': self.user.tenant.id if self.user.tenant else None,
-            'tenant_name': self.user.tenant.store_name if self.user.tenant else None,
+            'tenant_id': self.user.tenant_id,
+            'tenant_name': tenant.store_name if tenant else None,
             'role': self.user.role,
         }
 
         return data
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
-    tenant_name = serializers.CharField(source='tenant.store_name', read_only=True)
+    tenant_name = TenantNameField()
 
     class Meta:
         model = Product
@@ -80,7 +108,18 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'tenant', 'created_by', 'created_at', 'updated_at']
 
 
+class StorefrontProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Public view of an active product"""
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'description', 'price', 'stock_quantity', 'sku', 'created_at']
+        read_only_fields = fields
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
+    # Plain id - products are fetched in bulk and tenant-checked by place_order
+    product = serializers.IntegerField(source='product_id')
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
 
@@ -90,10 +129,10 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'price_at_order', 'subtotal']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=False)
     customer_username = serializers.CharField(source='customer.username', read_only=True)
-    tenant_name = serializers.CharField(source='tenant.store_name', read_only=True)
+    tenant_name = TenantNameField()
 
     class Meta:
         model = Order
@@ -101,46 +140,34 @@ class OrderSerializer(serializers.ModelSerializer):
                   'status', 'total_amount', 'shipping_address', 'notes', 'items', 'created_at', 'updated_at']
         read_only_fields = ['id', 'tenant', 'customer', 'order_number', 'total_amount', 'created_at', 'updated_at']
 
-    def create(self, validated_data):
-        items_data = validated_data.pop('items')
-
-        # Set initial total_amount to 0
-        validated_data['total_amount'] = 0
-        order = Order.objects.create(**validated_data)
-
-        total = 0
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-
-            # Check stock availability
-            if product.stock_quantity < quantity:
-                raise serializers.ValidationError(f"Insufficient stock for {product.name}")
-
-            # Create order item
-            order_item = OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price_at_order=product.price
-            )
-
-            # Update product stock
-            product.stock_quantity -= quantity
-            product.save()
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("An order must contain at least one item.")
+        return value
 
-            total += order_item.subtotal
+    def validate_status(self, value):
+        if self.instance is None:
+            if value != Order.Status.PENDING:
+                raise serializers.ValidationError("New orders start as PENDING.")
+        elif value != self.instance.status and not Order.can_transition(self.instance.status, value):
+            raise serializers.ValidationError(f"Can't move an order from {self.instance.status} to {value}.")
+        return value
 
-        # Update order total
-        order.total_amount = total
-        order.save()
-
-        return order
+    def create(self, validated_data):
+        return place_order(**validated_data)
 
     def update(self, instance, validated_data):
         # Don't allow updating items through this serializer
         validated_data.pop('items', None)
 
+        # Status changes go through the same transition check as update_status
+        new_status = validated_data.pop('status', instance.status)
+        if new_status != instance.status:
+            change = change_order_status(instance.tenant_id, new_status, [instance.id])
+            if not change.updated:
+                raise serializers.ValidationError({'status': [change.rejected[0]['error']]})
+            instance.refresh_from_db(fields=['status', 'updated_at'])
+
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
@@ -148,13 +175,88 @@ class OrderSerializer(serializers.ModelSerializer):
         return instance
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     customer_username = serializers.CharField(source='customer.username', read_only=True)
-    tenant_name = serializers.CharField(source='tenant.store_name', read_only=True)
-    items_count = serializers.IntegerField(source='items.count', read_only=True)
+    tenant_name = TenantNameField()
+    # Annotated by OrderViewSet.get_queryset
+    items_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Order
         fields = ['id', 'tenant_name', 'customer_username', 'order_number', 'status',
                   'total_amount', 'items_count', 'created_at']
         read_only_fields = fields
+
+
+class OrderBatchStatusSerializer(serializers.Serializer):
+    """Orders to move to `status`: listed by `ids`, or every order in `from_status`"""
+    status = serializers.ChoiceField(choices=Order.Status.choices)
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000, required=False)
+    from_status = serializers.ChoiceField(choices=Order.Status.choices, required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('from_status' in attrs):
+            raise serializers.ValidationError("Send either ids or from_status.")
+        if 'created_before' in attrs and 'from_status' not in attrs:
+            raise serializers.ValidationError("created_before can only be used with from_status.")
+        return attrs
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='product_id')
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    ttl_seconds = serializers.IntegerField(write_only=True, required=False, min_value=1)
+
+    class Meta:
+        model = StockReservation
+        fields = ['id', 'product', 'product_name', 'quantity', 'status', 'order',
+                  'ttl_seconds', 'expires_at', 'created_at']
+        read_only_fields = ['id', 'status', 'order', 'expires_at', 'created_at']
+
+    def validate_ttl_seconds(self, value):
+        if value > settings.RESERVATION_MAX_TTL:
+            raise serializers.ValidationError(
+                f"Reservations can be held for at most {settings.RESERVATION_MAX_TTL} seconds."
+            )
+        return value
+
+    def create(self, validated_data):
+        return reserve_stock(**validated_data)
+
+
+class ReservationConfirmSerializer(serializers.Serializer):
+    reservations = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    shipping_address = serializers.CharField()
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class SalesQuerySerializer(serializers.Serializer):
+    """Date range of a sales report, the last 30 days by default"""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000, default=20)
+
+    def validate(self, attrs):
+        attrs.setdefault('date_to', timezone.localdate())
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=29))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        return attrs
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['date', 'order_count', 'units', 'revenue']
+        read_only_fields = fields
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    """Sales of one product over a date range, read from ProductDailySales aggregates"""
+    product = serializers.IntegerField(source='product_id')
+    product_name = serializers.CharField(source='product__name')
+    product_sku = serializers.CharField(source='product__sku')
+    order_count = serializers.IntegerField(source='total_orders')
+    units = serializers.IntegerField(source='total_units')
+    revenue = serializers.DecimalField(source='total_revenue', max_digits=14, decimal_places=2)
@@ -0,0 +1,174 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .analytics import record_order, remove_orders
+from .caching import order_versions
+from .inventory import decrement_stock, InsufficientStock
+from .models import Product, Order, OrderItem
+from .ordernumbers import get_generator
+from .outbox import record_order_created, record_status_changes
+from .routers import db_for_tenant
+
+
+def generate_order_number(tenant_id):
+    """Next order number of the tenant from settings.ORDER_NUMBER_GENERATOR"""
+    return get_generator().next_number(tenant_id)
+
+
+def place_order(tenant_id, customer, order_number, items, **order_fields):
+    """
+    Create an order with its items and take the ordered quantities out of stock.
+
+    Everything runs in one transaction with a fixed number of queries:
+    one SELECT for the products, one conditional UPDATE for the stock
+    (core.inventory.decrement_stock), one INSERT for the order, one
+    bulk INSERT for the items, one upsert per sales summary table
+    (core.analytics.record_order) and, for tenants with a webhook, one
+    INSERT into the outbox (core.outbox).
+    `items` is a list of {'product_id': ..., 'quantity': ...} dicts.
+    """
+    # Same product may appear on several lines - stock is checked on the sum
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+
+    with transaction.atomic(using=db_for_tenant(tenant_id)):
+        # No row locks: the stock decrement below is a conditional UPDATE
+        products = (
+            Product.objects
+            .filter(tenant_id=tenant_id, is_active=True, id__in=quantities)
+            .in_bulk()
+        )
+
+        missing = [pk for pk in quantities if pk not in products]
+        if missing:
+            raise ValidationError({
+                'items': [f"Product {pk} is not available" for pk in missing]
+            })
+
+        try:
+            decrement_stock(tenant_id, quantities)
+        except InsufficientStock as e:
+            errors = [f"Insufficient stock for {products[pk].name}" for pk in e.failed]
+            raise ValidationError({
+                'items': errors or ["Insufficient stock for one or more products"]
+            })
+
+        order = create_order_with_items(
+            tenant_id, customer, order_number, products, items, **order_fields
+        )
+
+    return order
+
+
+def create_order_with_items(tenant_id, customer, order_number, products, items, **order_fields):
+    """
+    Insert an order and its items with two queries. Stock must already be taken care of.
+    `products` maps product id -> Product, `items` is a list of product_id/quantity dicts.
+    """
+    order_items = []
+    total = 0
+    for item in items:
+        product = products[item['product_id']]
+        subtotal = product.price * item['quantity']
+        total += subtotal
+        order_items.append(OrderItem(
+            product=product,
+            quantity=item['quantity'],
+            price_at_order=product.price,
+            subtotal=subtotal,
+        ))
+
+    order = Order.objects.create(
+        tenant_id=tenant_id,
+        customer=customer,
+        order_number=order_number,
+        total_amount=total,
+        **order_fields
+    )
+
+    for order_item in order_items:
+        order_item.order = order
+    # bulk_create bypasses OrderItem.save, subtotals are computed above
+    OrderItem.objects.bulk_create(order_items)
+
+    record_order(order, order_items)
+    record_order_created(order)
+
+    return order
+
+
+class StatusChange:
+    """Result of change_order_status: ids moved to the new status and per-order rejections"""
+
+    def __init__(self, status, updated, rejected):
+        self.status = status
+        self.updated = updated
+        self.rejected = rejected
+
+    def as_dict(self):
+        return {'status': self.status, 'updated': self.updated, 'rejected': self.rejected}
+
+
+def change_order_status(tenant_id, new_status, order_ids=None, **filters):
+    """
+    Move the tenant's orders to `new_status` along Order.TRANSITIONS.
+
+    Orders are picked by `order_ids` or by queryset `filters` (e.g.
+    status=..., created_at__lt=...). One SELECT locks the orders and reads their
+    statuses, and one UPDATE applies the change to every order allowed to
+    make it; the others are reported in `rejected` with the reason.
+    Cancelled orders are taken out of the sales summaries. Tenants with a
+    webhook get an order.status_changed event per order.
+    """
+    sources = Order.statuses_leading_to(new_status)
+    now = timezone.now()
+
+    orders = Order.objects.filter(tenant_id=tenant_id, **filters)
+    if order_ids is not None:
+        order_ids = list(dict.fromkeys(order_ids))
+        orders = orders.filter(id__in=order_ids)
+
+    with transaction.atomic(using=db_for_tenant(tenant_id)):
+        current = dict(orders.select_for_update().order_by('id').values_list('id', 'status'))
+        eligible = sorted(pk for pk, status in current.items() if status in sources)
+
+        if eligible:
+            # Only the rows read (and locked) above: orders matching the
+            # filters since then are not part of this change
+            just_changed = Order.objects.filter(tenant_id=tenant_id, id__in=eligible)
+            just_changed.update(status=new_status, updated_at=now)
+
+            if new_status == Order.Status.CANCELLED:
+                # Cancelled orders no longer count as sales
+                remove_orders(just_changed)
+
+            record_status_changes(tenant_id, {pk: current[pk] for pk in eligible}, new_status)
+            # QuerySet.update sends no signals
+            order_versions.bump_on_commit(tenant_id)
+
+    updated = set(eligible)
+    rejected = []
+    for pk in (order_ids if order_ids is not None else sorted(current)):
+        if pk in updated:
+            continue
+        if pk not in current:
+            rejected.append({'id': pk, 'status': None, 'error': 'Order not found'})
+        elif current[pk] == new_status:
+            rejected.append({'id': pk, 'status': current[pk], 'error': f"Order is already {new_status}"})
+        else:
+            rejected.append({
+                'id': pk, 'status': current[pk],
+                'error': f"Can't move an order from {current[pk]} to {new_status}"
+            })
+
+    return StatusChange(new_status, eligible, rejected)
+
+
+def delete_order(order):
+    """Delete an order, taking it out of the sales summaries unless it was cancelled"""
+    with transaction.atomic(using=db_for_tenant(order.tenant_id)):
+        if order.status != Order.Status.CANCELLED:
+            remove_orders(Order.objects.filter(id=order.id))
+        order.delete()
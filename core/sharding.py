@@ -0,0 +1,209 @@
+"""
+Moving tenants between databases (see core/routers.py for the routing).
+
+Every shard hands out ids of tenant-owned rows from its own block
+(reserve_id_range runs after migrate), so move_tenant copies a tenant's
+rows with their ids unchanged: foreign keys, URLs and issued JWTs keep
+pointing at the same rows on the new database.
+"""
+import hashlib
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import (
+    Tenant, User, Product, Order, OrderItem, StockReservation, DailySales, ProductDailySales,
+    IdempotencyKey, OrderNumberSequence, OutboxEvent,
+)
+from .routers import tenant_databases
+
+# Tenant-owned models, referenced ones first
+TENANT_MODELS = [
+    User, Product, Order, OrderItem, StockReservation, DailySales, ProductDailySales,
+    IdempotencyKey, OrderNumberSequence, OutboxEvent,
+]
+
+
+class MoveError(Exception):
+    pass
+
+
+def tenant_rows(model, tenant_id, using):
+    queryset = model._base_manager.using(using)
+    if model is OrderItem:
+        return queryset.filter(order__tenant_id=tenant_id)
+    return queryset.filter(tenant_id=tenant_id)
+
+
+def reserve_id_range(using):
+    """Start new ids of the tenant-owned tables of shard `using` at its block of SHARD_ID_BLOCK ids"""
+    shards = getattr(settings, 'TENANT_SHARDS', [])
+    if using not in shards:
+        return
+
+    start = (shards.index(using) + 1) * settings.SHARD_ID_BLOCK
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model in TENANT_MODELS:
+            table = model._meta.db_table
+            if connection.vendor == 'sqlite':
+                # sqlite_sequence keeps the last id handed out for AUTOINCREMENT tables
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s", [start, table, start]
+                )
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                    [table, start, table]
+                )
+            elif connection.vendor == 'postgresql':
+                column = model._meta.pk.column
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, %s), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX({qn(column)}), 0) FROM {qn(table)})))",
+                    [table, column, start]
+                )
+
+
+def _row_values(model, queryset, batch_size):
+    """Batches of the rows' concrete field values, in primary key order"""
+    fields = model._meta.concrete_fields
+    rows = queryset.order_by('pk').values_list(*[field.attname for field in fields]).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _checksum(model, queryset, batch_size):
+    """Digest of every column of every row, to tell whether rows changed"""
+    digest = hashlib.sha256()
+    for batch in _row_values(model, queryset, batch_size):
+        for row in batch:
+            digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def _copy_rows(model, queryset, target, batch_size, user_ids=None):
+    """
+    INSERT the rows into `target` as they are - bulk_create would reset
+    auto_now fields. Nullable references to users outside `user_ids` (e.g.
+    products created by a superuser) are cleared.
+    Returns the row count and the _checksum of the rows as they were read.
+    """
+    fields = model._meta.concrete_fields
+    cleared = [
+        index for index, field in enumerate(fields)
+        if user_ids is not None and field.is_relation and field.related_model is User and field.null
+    ]
+
+    connection = connections[target]
+    qn = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        qn(model._meta.db_table),
+        ', '.join(qn(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+
+    count = 0
+    digest = hashlib.sha256()
+    with connection.cursor() as cursor:
+        for batch in _row_values(model, queryset, batch_size):
+            params = []
+            for row in batch:
+                digest.update(repr(row).encode())
+                row = list(row)
+                for index in cleared:
+                    if row[index] not in user_ids:
+                        row[index] = None
+                params.append([field.get_db_prep_save(value, connection) for field, value in zip(fields, row)])
+            cursor.executemany(sql, params)
+            count += len(batch)
+    return count, digest.hexdigest()
+
+
+def _set_read_only(tenant, read_only):
+    tenant.is_read_only = read_only
+    tenant.save(update_fields=['is_read_only', 'updated_at'])
+
+
+def move_tenant(tenant, target, batch_size=1000, wait=None, log=None):
+    """
+    Copy the tenant's rows to the `target` database, point the tenant at it
+    and delete the rows from the database they came from. Many-to-many
+    links of users (groups, permissions) are not moved.
+
+    Other processes only see tenant changes when their tenant registry entry
+    expires, so the move waits `wait` seconds (default TENANT_CACHE_TTL)
+    twice: after making the tenant read-only, before copying, so no request
+    writes to the old rows any more; and after switching the tenant over,
+    before deleting the old rows, so no request reads them any more.
+    `log` is called with a message before each wait.
+
+    Raises MoveError, leaving everything as it was, when the target already
+    has rows of the tenant or rows were written while copying (e.g. by
+    background commands, which do not check is_read_only).
+    Returns {model label: rows moved}.
+    """
+    source = tenant.db_alias
+    if target not in tenant_databases():
+        raise MoveError(f"{target} is not a tenant database, add it to TENANT_SHARDS")
+    if target == source:
+        raise MoveError(f"{tenant.store_name} is already on {target}")
+
+    for model in TENANT_MODELS:
+        if tenant_rows(model, tenant.id, target).exists():
+            raise MoveError(f"{target} already has {model._meta.verbose_name_plural} of {tenant.store_name}")
+
+    if wait is None:
+        wait = settings.TENANT_CACHE_TTL
+    log = log or (lambda message: None)
+    was_read_only = tenant.is_read_only
+
+    _set_read_only(tenant, True)
+    moved = {}
+    try:
+        log(f"{tenant.store_name} is read-only, waiting {wait}s for other processes to notice")
+        time.sleep(wait)
+
+        with transaction.atomic(using=target):
+            if target != DEFAULT_DB_ALIAS:
+                # Foreign keys to the tenant need its row; the default database keeps the original
+                Tenant._base_manager.using(target).filter(pk=tenant.pk).delete()
+                tenant_row = Tenant._base_manager.using(DEFAULT_DB_ALIAS).filter(pk=tenant.pk)
+                _copy_rows(Tenant, tenant_row, target, batch_size)
+
+            user_ids = set(tenant_rows(User, tenant.id, source).values_list('id', flat=True))
+            copied = {}
+            for model in TENANT_MODELS:
+                moved[model._meta.label], copied[model] = _copy_rows(
+                    model, tenant_rows(model, tenant.id, source), target, batch_size, user_ids
+                )
+
+            # Compares every column, so updates are caught as well as inserts and deletes
+            for model in TENANT_MODELS:
+                if _checksum(model, tenant_rows(model, tenant.id, source), batch_size) != copied[model]:
+                    raise MoveError(f"{model._meta.verbose_name_plural} of {tenant.store_name} changed while copying")
+    except BaseException:
+        # Also on KeyboardInterrupt - the store must not stay read-only
+        _set_read_only(tenant, was_read_only)
+        raise
+
+    tenant.db_alias = target
+    tenant.is_read_only = was_read_only
+    tenant.save(update_fields=['db_alias', 'is_read_only', 'updated_at'])
+
+    log(f"{tenant.store_name} is on {target}, waiting {wait}s before deleting the rows on {source}")
+    time.sleep(wait)
+
+    with transaction.atomic(using=source):
+        for model in reversed(TENANT_MODELS):
+            tenant_rows(model, tenant.id, source).delete()
+        if source != DEFAULT_DB_ALIAS:
+            Tenant._base_manager.using(source).filter(pk=tenant.pk).delete()
+
+    return moved
@@ -0,0 +1,46 @@
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .caching import catalog_cache, order_versions
+from .models import Tenant, Product, Order
+from .sharding import reserve_id_range
+from .tenants import tenant_host_map, tenant_registry
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_cached_tenant(sender, instance, **kwargs):
+    """Drop the tenant from the in-process registry whenever it changes"""
+    tenant_registry.invalidate(instance.id)
+
+
+@receiver(post_save, sender=Tenant)
+def update_tenant_hosts(sender, instance, **kwargs):
+    tenant_host_map.update(instance)
+
+
+@receiver(post_delete, sender=Tenant)
+def remove_tenant_hosts(sender, instance, **kwargs):
+    tenant_host_map.update(instance, deleted=True)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, instance, **kwargs):
+    """Any product change invalidates the tenant's cached catalog responses"""
+    catalog_cache.bump_on_commit(instance.tenant_id)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Product)
+def bump_order_version(sender, instance, **kwargs):
+    """Order saves and deletes change the tenant's order lists, so do product deletes (their items go)"""
+    order_versions.bump_on_commit(instance.tenant_id)
+
+
+@receiver(post_migrate)
+def reserve_shard_ids(sender, using, **kwargs):
+    """Give a newly migrated tenant shard its own block of ids"""
+    if sender.name == 'core':
+        reserve_id_range(using)
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http.request import split_domain_port
+
+from .models import Tenant
+
+
+class TenantRegistry:
+    """
+    Process-local LRU cache of Tenant rows with a TTL.
+    Tenants can be looked up by id, subdomain or domain; every key points at the same entry.
+    Entries are invalidated through Tenant post_save/post_delete signals (see core/signals.py),
+    the TTL bounds staleness for changes made by other processes.
+    """
+    LOOKUP_FIELDS = ['id', 'subdomain', 'domain']
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or getattr(settings, 'TENANT_CACHE_MAX_SIZE', 1024)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'TENANT_CACHE_TTL', 300)
+        self._entries = OrderedDict()   # tenant id -> (tenant, expires_at)
+        self._aliases = {}              # (field, value) -> tenant id
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tenant_id):
+        """Return the Tenant with this id, or None if it does not exist"""
+        if tenant_id is None:
+            return None
+        return self._lookup('id', tenant_id)
+
+    def get_by_subdomain(self, subdomain):
+        return self._lookup('subdomain', subdomain)
+
+    def get_by_domain(self, domain):
+        return self._lookup('domain', domain)
+
+    def _lookup(self, field, value):
+        key = (field, value)
+        now = time.monotonic()
+
+        with self._lock:
+            tenant_id = value if field == 'id' else self._aliases.get(key)
+            entry = self._entries.get(tenant_id)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(tenant_id)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(tenant_id)
+            self.misses += 1
+
+        tenant = Tenant.objects.filter(**{field: value}).first()
+        if tenant is not None:
+            self._store(tenant, now + self.ttl)
+        return tenant
+
+    def _store(self, tenant, expires_at):
+        with self._lock:
+            self._remove(tenant.id)
+            self._entries[tenant.id] = (tenant, expires_at)
+            for field in self.LOOKUP_FIELDS[1:]:
+                value = getattr(tenant, field)
+                if value:
+                    self._aliases[(field, value)] = tenant.id
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, tenant_id):
+        # Caller must hold the lock
+        entry = self._entries.pop(tenant_id, None)
+        if entry is None:
+            return
+        for field in self.LOOKUP_FIELDS[1:]:
+            key = (field, getattr(entry[0], field))
+            if self._aliases.get(key) == tenant_id:
+                del self._aliases[key]
+
+    def invalidate(self, tenant_id):
+        with self._lock:
+            self._remove(tenant_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+tenant_registry = TenantRegistry()
+
+
+class TenantHostMap:
+    """
+    Host name -> Tenant table for telling the tenant from the Host header.
+    Every active tenant is listed under its domain and under
+    <subdomain>.TENANT_BASE_DOMAIN, so resolving a host is one dict lookup.
+    The table is built with one query on first use, saved and deleted
+    tenants are applied to it in place (see core/signals.py) and it is
+    rebuilt every TENANT_CACHE_TTL seconds for changes made by other processes.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'TENANT_CACHE_TTL', 300)
+        self._hosts = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, host):
+        """Tenant served at `host` (a Host header, port ignored), None if there is none"""
+        hosts = self._hosts
+        if hosts is None or time.monotonic() >= self._expires_at:
+            hosts = self._build()
+        domain, _ = split_domain_port(host)
+        return hosts.get(domain)
+
+    def _build(self):
+        with self._lock:
+            if self._hosts is not None and time.monotonic() < self._expires_at:
+                return self._hosts
+
+            hosts = {}
+            for tenant in Tenant.objects.filter(is_active=True):
+                hosts.update(self._hosts_of(tenant))
+
+            # Readers keep using the old table until this swap
+            self._hosts = hosts
+            self._expires_at = time.monotonic() + self.ttl
+            return hosts
+
+    @staticmethod
+    def _hosts_of(tenant):
+        base_domain = getattr(settings, 'TENANT_BASE_DOMAIN', '').strip('.').lower()
+        hosts = {}
+        if base_domain:
+            hosts[f'{tenant.subdomain}.{base_domain}'.lower()] = tenant
+        if tenant.domain:
+            hosts[tenant.domain.lower()] = tenant
+        return hosts
+
+    def update(self, tenant, deleted=False):
+        """Apply a saved or deleted tenant to the table, without a query"""
+        with self._lock:
+            if self._hosts is None:
+                return
+            hosts = {host: entry for host, entry in self._hosts.items() if entry.id != tenant.id}
+            if tenant.is_active and not deleted:
+                hosts.update(self._hosts_of(tenant))
+            self._hosts = hosts
+
+    def invalidate(self):
+        with self._lock:
+            self._hosts = None
+
+
+tenant_host_map = TenantHostMap()
@@ -1,3 +1,2042 @@
-from django.test import TestCase
+import csv
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import QuerySet
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import sharding
+from .authentication import principal_from_token
+from .caching import catalog_cache
+from .inventory import InsufficientStock, decrement_stock, inventory_metrics
+from .models import (
+    Tenant, User, Product, Order, OrderItem, StockReservation, DailySales, ProductDailySales,
+    IdempotencyKey, OrderNumberSequence, OutboxEvent
+)
+from .ordernumbers import SequenceOrderNumberGenerator, get_generator
+from .outbox import _claim, process_outbox
+from .rendering import FastJSONRenderer
+from .reservations import release_expired_reservations, release_reservation
+from .routers import use_tenant_database
+from .serializers import CustomTokenObtainPairSerializer
+from .services import place_order
+from .tenants import TenantRegistry, tenant_host_map, tenant_registry
+from .throttling import RateLimiter, rate_limiter
+
+
+class TenantFixtureMixin:
+    """A tenant, a store owner and a customer"""
+    password = 'password123'
+
+    def setUp(self):
+        # Tenant ids are reused between tests, so start from empty caches
+        tenant_registry.clear()
+        tenant_host_map.invalidate()
+        rate_limiter.clear()
+        get_generator().clear()
+        cache.clear()
+
+        self.tenant = Tenant.objects.create(
+            store_name='Tech Store',
+            subdomain='techstore',
+            domain='techstore.example.com',
+            contact_email='admin@techstore.com'
+        )
+        self.owner = User.objects.create_user(
+            username='owner', password=self.password,
+            tenant=self.tenant, role=User.Role.STORE_OWNER
+        )
+        self.customer = User.objects.create_user(
+            username='customer', password=self.password,
+            tenant=self.tenant, role=User.Role.CUSTOMER
+        )
+
+    def login(self, user):
+        """Authenticate the test client with a JWT for the given user"""
+        response = self.client.post('/api/auth/login/', {
+            'username': user.username,
+            'password': self.password,
+            'tenant': user.tenant_id,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TenantAPITestCase(TenantFixtureMixin, APITestCase):
+    """Base test case with a tenant, a store owner and a customer"""
+
+
+class TokenAuthenticationTests(TenantAPITestCase):
+    """The bearer token is verified once by TenantMiddleware and reused by DRF"""
+
+    def test_token_is_decoded_once_per_request(self):
+        self.login(self.customer)
+        with mock.patch.object(
+            JWTAuthentication, 'get_validated_token', autospec=True,
+            side_effect=JWTAuthentication.get_validated_token
+        ) as get_validated_token:
+            response = self.client.get('/api/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_validated_token.call_count, 1)
+
+    def assert_unauthorized(self, header):
+        self.client.credentials(HTTP_AUTHORIZATION=header)
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_malformed_headers(self):
+        self.assert_unauthorized('Bearer')
+        self.assert_unauthorized('Bearer a b')
+        self.assert_unauthorized('Bearer not-a-jwt')
+
+    def test_expired_token(self):
+        token = AccessToken.for_user(self.customer)
+        token['tenant_id'] = self.tenant.id
+        token.set_exp(lifetime=-timedelta(minutes=1))
+        self.assert_unauthorized(f'Bearer {token}')
+
+
+@override_settings(STATELESS_PRINCIPAL=True)
+class StatelessPrincipalTests(TenantAPITestCase):
+    """request.user built from the token claims, without reading the users table"""
+
+    def get_products(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/')
+        return response, [query['sql'] for query in queries]
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_no_user_query(self):
+        self.login(self.customer)
+        response, queries = self.get_products()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([sql for sql in queries if 'FROM "users"' in sql])
+
+        cache.clear()
+        with override_settings(STATELESS_PRINCIPAL=False):
+            _, stateful_queries = self.get_products()
+        self.assertEqual(len(stateful_queries), len(queries) + 1)
+
+    def test_other_fields_load_on_first_access(self):
+        self.customer.first_name = 'Ada'
+        self.customer.save()
+        token = CustomTokenObtainPairSerializer.get_token(self.customer).access_token
+
+        with self.assertNumQueries(0):
+            user = principal_from_token(token)
+            self.assertEqual((user.pk, user.tenant_id, user.role), (self.customer.pk, self.tenant.id, 'CUSTOMER'))
+            self.assertEqual(user.username, 'customer')
+
+        # Every deferred field is fetched by the first access
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, 'Ada')
+            self.assertEqual(user.date_joined, self.customer.date_joined)
+
+    def test_inactive_claim(self):
+        self.customer.is_active = False
+        self.authenticate(CustomTokenObtainPairSerializer.get_token(self.customer).access_token)
+        self.assertEqual(self.client.get('/api/products/').status_code, 401)
+
+    def test_role_comes_from_the_token(self):
+        self.login(self.customer)
+        User.objects.filter(pk=self.customer.pk).update(role=User.Role.STORE_OWNER)
+
+        # The claims stay authoritative until the token expires
+        self.assertEqual(self.client.get('/api/analytics/sales/daily/').status_code, 403)
+        with override_settings(STATELESS_PRINCIPAL=False):
+            self.assertEqual(self.client.get('/api/analytics/sales/daily/').status_code, 200)
+
+    def test_legacy_token_falls_back_to_the_database(self):
+        token = AccessToken.for_user(self.customer)
+        token['tenant_id'] = self.tenant.id
+        token['role'] = self.customer.role
+        self.assertIsNone(principal_from_token(token))
+
+        self.authenticate(token)
+        response, queries = self.get_products()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue([sql for sql in queries if 'FROM "users"' in sql])
+
+
+class TenantRegistryTests(TenantAPITestCase):
+    """Process-local tenant cache: LRU, TTL and signal invalidation"""
+
+    def setUp(self):
+        super().setUp()
+        self.others = [
+            Tenant.objects.create(store_name=f'Store {i}', subdomain=f'store{i}', contact_email='s@example.com')
+            for i in range(2)
+        ]
+
+    def test_hits_and_misses(self):
+        registry = TenantRegistry(max_size=10, ttl=60)
+        with self.assertNumQueries(1):
+            self.assertEqual(registry.get(self.tenant.id), self.tenant)
+            self.assertEqual(registry.get_by_subdomain('techstore'), self.tenant)
+            self.assertEqual(registry.get_by_domain('techstore.example.com'), self.tenant)
+        self.assertIsNone(registry.get(999999))
+
+        self.assertEqual(registry.stats(), {'size': 1, 'hits': 2, 'misses': 2, 'hit_ratio': 0.5})
+
+    def test_least_recently_used_is_evicted(self):
+        registry = TenantRegistry(max_size=2, ttl=60)
+        registry.get(self.tenant.id)
+        registry.get(self.others[0].id)
+        registry.get(self.tenant.id)
+        registry.get(self.others[1].id)
+
+        self.assertEqual(registry.stats()['size'], 2)
+        with self.assertNumQueries(0):
+            registry.get(self.tenant.id)
+            registry.get(self.others[1].id)
+        with self.assertNumQueries(1):
+            registry.get(self.others[0].id)
+        # Aliases of evicted tenants go with them
+        with self.assertNumQueries(1):
+            registry.get_by_subdomain('techstore')
+
+    def test_entries_expire(self):
+        registry = TenantRegistry(max_size=10, ttl=60)
+        with mock.patch('core.tenants.time.monotonic', return_value=1000.0):
+            registry.get(self.tenant.id)
+        with mock.patch('core.tenants.time.monotonic', return_value=1059.0), self.assertNumQueries(0):
+            registry.get(self.tenant.id)
+        with mock.patch('core.tenants.time.monotonic', return_value=1060.0), self.assertNumQueries(1):
+            registry.get(self.tenant.id)
+
+    def test_save_and_delete_invalidate(self):
+        tenant_registry.get(self.tenant.id)
+        self.tenant.store_name = 'Gadget Store'
+        self.tenant.subdomain = 'gadgets'
+        self.tenant.save()
+
+        self.assertEqual(tenant_registry.get(self.tenant.id).store_name, 'Gadget Store')
+        self.assertIsNone(tenant_registry.get_by_subdomain('techstore'))
+        self.assertEqual(tenant_registry.get_by_subdomain('gadgets'), self.tenant)
+
+        other_id = self.others[0].id
+        tenant_registry.get(other_id)
+        self.others[0].delete()
+        self.assertIsNone(tenant_registry.get(other_id))
+
+    def test_inactive_tenant_is_rejected(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+
+        self.tenant.is_active = False
+        self.tenant.save()
+        self.assertEqual(self.client.get('/api/products/').status_code, 403)
+
+
+class ProductListQueryBudgetTests(TenantAPITestCase):
+    """The product list must cost the same number of queries for any page size"""
+
+    # user lookup + product rows (creators joined); the list ETag comes from
+    # the cache and keyset pagination needs no COUNT(*)
+    QUERY_BUDGET = 2
+
+    def assert_list_within_budget(self, product_count):
+        creators = [
+            User.objects.create_user(
+                username=f'staff{i}', password=self.password,
+                tenant=self.tenant, role=User.Role.STAFF
+            )
+            for i in range(product_count)
+        ]
+        for i, creator in enumerate(creators):
+            Product.objects.create(
+                tenant=self.tenant, name=f'Product {i}', price=Decimal('9.99'),
+                stock_quantity=10, sku=f'SKU-{i}', created_by=creator
+            )
+
+        self.login(self.customer)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get('/api/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), product_count)
+        usernames = {row['created_by_username'] for row in response.data['results']}
+        self.assertEqual(usernames, {creator.username for creator in creators})
+
+    def test_single_product_page(self):
+        self.assert_list_within_budget(1)
+
+    def test_full_product_page(self):
+        self.assert_list_within_budget(10)
+
+
+class OrderQueryBudgetTests(TenantAPITestCase):
+    """Order lists and details cost a fixed number of queries, whatever the page or item count"""
+
+    # user lookup + order rows (customer joined, items counted)
+    LIST_BUDGET = 2
+    # user lookup + updated_at validator + order row + items with their products
+    DETAIL_BUDGET = 4
+
+    def setUp(self):
+        super().setUp()
+        products = [
+            Product.objects.create(
+                tenant=self.tenant, name=f'Product {i}', price=Decimal('5.00'),
+                stock_quantity=100, sku=f'SKU-{i}', created_by=self.owner
+            )
+            for i in range(3)
+        ]
+        self.login(self.customer)
+        self.order_ids = [
+            self.client.post('/api/orders/', {
+                'items': [{'product': product.id, 'quantity': 1} for product in products],
+                'shipping_address': '1 Main St',
+            }, format='json').data['id']
+            for _ in range(4)
+        ]
+
+    def assert_list_within_budget(self, url):
+        for page_size in (1, 4):
+            cache.clear()
+            with self.assertNumQueries(self.LIST_BUDGET):
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertEqual({row['items_count'] for row in response.data['results']}, {3})
+
+    def test_list(self):
+        self.login(self.owner)
+        self.assert_list_within_budget('/api/orders/')
+
+    def test_my_orders(self):
+        self.assert_list_within_budget('/api/orders/my_orders/')
+
+    def test_detail(self):
+        with self.assertNumQueries(self.DETAIL_BUDGET):
+            response = self.client.get(f'/api/orders/{self.order_ids[0]}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['product_name'] for item in response.data['items']],
+                         ['Product 0', 'Product 1', 'Product 2'])
+
+
+class PlaceOrderTests(TenantAPITestCase):
+    """place_order writes everything or nothing, with a fixed number of queries"""
+
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.objects.create(
+                tenant=self.tenant, name=f'Product {i}', price=Decimal('5.00'),
+                stock_quantity=10, sku=f'SKU-{i}', created_by=self.owner
+            )
+            for i in range(3)
+        ]
+
+    def place(self, quantities):
+        return place_order(
+            self.tenant.id, self.customer, 'ORD-TEST',
+            [{'product_id': product.id, 'quantity': qty} for product, qty in zip(self.products, quantities)],
+            shipping_address='1 Main St'
+        )
+
+    def assert_nothing_written(self):
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(DailySales.objects.exists())
+        self.assertFalse(ProductDailySales.objects.exists())
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('stock_quantity', flat=True)), [10, 10, 10]
+        )
+
+    def test_short_line_writes_nothing(self):
+        with self.assertRaises(ValidationError) as raised:
+            self.place([1, 2, 11])
+        self.assertEqual(raised.exception.detail['items'], ['Insufficient stock for Product 2'])
+        self.assert_nothing_written()
+
+    def test_failure_after_the_stock_update_rolls_back(self):
+        with mock.patch('core.services.record_order_created', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.place([1, 2, 3])
+        self.assert_nothing_written()
+
+    def test_fixed_number_of_queries(self):
+        # The outbox reads webhook settings from the tenant registry
+        tenant_registry.get(self.tenant.id)
+        # Transaction (a savepoint in tests), SELECT products, stock UPDATE in its savepoint,
+        # order INSERT, items INSERT, two summary upserts - the same for any number of lines
+        for count in (1, 3):
+            with self.assertNumQueries(2 + 1 + 3 + 2 + 2):
+                order = place_order(
+                    self.tenant.id, self.customer, f'ORD-{count}',
+                    [{'product_id': product.id, 'quantity': 1} for product in self.products[:count]],
+                    shipping_address='1 Main St'
+                )
+            self.assertEqual(order.items.count(), count)
+
+
+class KeysetPaginationTests(TenantAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Products sharing created_at exercise the id tie-breaker
+        self.products = [
+            Product.objects.create(
+                tenant=self.tenant, name=f'Product {i}', price=Decimal('9.99'),
+                stock_quantity=10, sku=f'SKU-{i}', created_by=self.owner
+            )
+            for i in range(5)
+        ]
+        Product.objects.filter(id__in=[p.id for p in self.products[:3]]).update(
+            created_at=self.products[0].created_at
+        )
+        self.login(self.customer)
+
+    def fetch_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']], response.data
+
+    def test_walks_all_pages_forward_and_back(self):
+        expected = list(
+            Product.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+        first_ids, first = self.fetch_ids('/api/products/?page_size=2')
+        self.assertIsNone(first['previous'])
+        second_ids, second = self.fetch_ids(first['next'])
+        third_ids, third = self.fetch_ids(second['next'])
+        self.assertIsNone(third['next'])
+        self.assertEqual(first_ids + second_ids + third_ids, expected)
+
+        back_ids, _ = self.fetch_ids(third['previous'])
+        self.assertEqual(back_ids, second_ids)
+
+    def test_page_number_mode_is_opt_in(self):
+        response = self.client.get('/api/products/?page=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSearchTests(TenantAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, sku in [('Wireless Mouse', 'MOUSE-001'), ('Mouse Pad', 'PAD-001'), ('Keyboard', 'KB-001')]:
+            Product.objects.create(
+                tenant=self.tenant, name=name, price=Decimal('9.99'),
+                stock_quantity=10, sku=sku, created_by=self.owner
+            )
+        other = Tenant.objects.create(store_name='Other', subdomain='other', contact_email='a@other.com')
+        Product.objects.create(tenant=other, name='Mouse Elsewhere', price=Decimal('1.00'), sku='M-1')
+        self.login(self.customer)
+
+    def search(self, query):
+        response = self.client.get('/api/products/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']]
+
+    def test_prefix_match_within_tenant(self):
+        self.assertCountEqual(self.search('mou'), ['Wireless Mouse', 'Mouse Pad'])
+
+    def test_exact_sku(self):
+        self.assertEqual(self.search('KB-001'), ['Keyboard'])
+
+    def test_index_follows_updates(self):
+        Product.objects.filter(sku='KB-001').update(name='Gaming Board')
+        self.assertEqual(self.search('gam'), ['Gaming Board'])
+        self.assertEqual(self.search('keyb'), [])
+
+
+class CatalogCacheTests(TenantAPITestCase):
+    """Cached catalog responses and the changes that invalidate them"""
+
+    def setUp(self):
+        super().setUp()
+        catalog_cache.reset_stats()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', price=Decimal('49.00'),
+            stock_quantity=10, sku='KB-1', created_by=self.owner
+        )
+        self.login(self.owner)
+
+    def get(self, url='/api/products/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def catalog(self):
+        return {row['sku']: row['stock_quantity'] for row in self.get().data['results']}
+
+    def test_hits_and_misses(self):
+        url = f'/api/products/{self.product.id}/'
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        self.assertEqual(self.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+
+        # Each role has its own entries
+        self.login(self.customer)
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+
+        self.assertEqual(catalog_cache.stats(), {'hits': 2, 'misses': 3, 'hit_ratio': 0.4})
+
+    def assert_invalidated_by(self, change, expected):
+        self.get()
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        version = catalog_cache.version(self.tenant.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+        self.assertGreater(catalog_cache.version(self.tenant.id), version)
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual({row['sku']: row['stock_quantity'] for row in response.data['results']}, expected)
+
+    def test_product_save(self):
+        def change():
+            self.client.patch(f'/api/products/{self.product.id}/', {'stock_quantity': 7}, format='json')
+        self.assert_invalidated_by(change, {'KB-1': 7})
+
+    def test_product_delete(self):
+        self.assert_invalidated_by(lambda: self.client.delete(f'/api/products/{self.product.id}/'), {})
+
+    def test_stock_change_from_an_order(self):
+        def change():
+            self.login(self.customer)
+            self.client.post('/api/orders/', {
+                'items': [{'product': self.product.id, 'quantity': 3}],
+                'shipping_address': '1 Main St',
+            }, format='json')
+            self.login(self.owner)
+        self.assert_invalidated_by(change, {'KB-1': 7})
+
+    def test_bulk_import(self):
+        def change():
+            self.client.generic(
+                'POST', '/api/products/bulk/', b'sku,name,price,stock_quantity\nMS-1,Mouse,19.00,4\n',
+                content_type='text/csv'
+            )
+        self.assert_invalidated_by(change, {'KB-1': 10, 'MS-1': 4})
+
+
+class ConditionalGetTests(TenantAPITestCase):
+    """Unchanged lists and objects are answered with 304 from the validators alone"""
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', price=Decimal('49.00'),
+            stock_quantity=10, sku='KB-1', created_by=self.owner
+        )
+        self.login(self.owner)
+
+    def assert_not_modified(self, url, queries):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        return etag
+
+    def assert_list_modified(self, change, etag, url='/api/products/'):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_product_list(self):
+        # user lookup only - the change stamp comes from the cache
+        etag = self.assert_not_modified('/api/products/', 1)
+        self.assertFalse(self.client.get('/api/products/').has_header('Last-Modified'))
+
+        self.assert_list_modified(lambda: Product.objects.create(
+            tenant=self.tenant, name='Mouse', price=Decimal('19.00'),
+            stock_quantity=5, sku='MS-1', created_by=self.owner
+        ), etag)
+
+    def test_product_list_after_delete(self):
+        older = Product.objects.create(
+            tenant=self.tenant, name='Mouse', price=Decimal('19.00'),
+            stock_quantity=5, sku='MS-1', created_by=self.owner
+        )
+        etag = self.assert_not_modified('/api/products/', 1)
+        # Deleting the newest row used to lower max(updated_at)
+        response = self.assert_list_modified(lambda: older.delete(), etag)
+        self.assertEqual([row['sku'] for row in response.data['results']], ['KB-1'])
+
+    def test_product_list_after_deactivation(self):
+        self.login(self.customer)
+        etag = self.assert_not_modified('/api/products/', 1)
+
+        def deactivate():
+            self.product.is_active = False
+            self.product.save()
+        response = self.assert_list_modified(deactivate, etag)
+        self.assertEqual(response.data['results'], [])
+
+    def test_product_detail(self):
+        url = f'/api/products/{self.product.id}/'
+        # user lookup + updated_at
+        etag = self.assert_not_modified(url, 2)
+
+        self.product.price = Decimal('39.00')
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        url = f'/api/products/{self.product.id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # Deactivated products are gone for customers
+        self.login(self.customer)
+        self.product.is_active = False
+        self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 404)
+
+        # Lists have no Last-Modified to compare with
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_order_list_and_detail(self):
+        self.login(self.customer)
+        response = self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': 1}],
+            'shipping_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order_id = response.data['id']
+
+        self.assert_not_modified('/api/orders/', 1)
+        self.assert_not_modified('/api/orders/my_orders/', 1)
+        self.assert_not_modified(f'/api/orders/{order_id}/', 2)
+
+        self.login(self.owner)
+        etag = self.assert_not_modified('/api/orders/', 1)
+        etag = self.assert_list_modified(
+            lambda: self.client.post(f'/api/orders/{order_id}/update_status/', {'status': 'CONFIRMED'}, format='json'),
+            etag, '/api/orders/'
+        )['ETag']
+        response = self.assert_list_modified(
+            lambda: self.client.delete(f'/api/orders/{order_id}/'), etag, '/api/orders/'
+        )
+        self.assertEqual(response.data['results'], [])
+
+    def test_missing_object(self):
+        response = self.client.get('/api/products/999999/', HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(response.status_code, 404)
+
+
+class FastRenderingTests(TenantAPITestCase):
+    """The FAST_RENDERING path must render exactly what the serializers do"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            Product.objects.create(
+                tenant=self.tenant, name=f'Café {i}', description='Line\u2028break',
+                price=Decimal('1.5') * (i + 1), stock_quantity=10, sku=f'SKU-{i}',
+                created_by=self.owner if i else None
+            )
+
+    def assert_same_output(self, url):
+        regular = self.client.get(url)
+        with override_settings(FAST_RENDERING=True):
+            fast = self.client.get(url)
+        self.assertEqual(regular.status_code, 200)
+        self.assertEqual(fast.json(), regular.json())
+
+    def test_product_list(self):
+        self.login(self.owner)
+        self.assert_same_output('/api/products/')
+        self.assert_same_output('/api/products/?page_size=2&search=caf')
+        self.assert_same_output('/api/products/?page=1')
+
+    def test_order_list(self):
+        self.login(self.customer)
+        product = Product.objects.first()
+        for _ in range(2):
+            self.client.post('/api/orders/', {
+                'items': [{'product': product.id, 'quantity': 2}],
+                'shipping_address': '1 Main St',
+            }, format='json')
+        self.assert_same_output('/api/orders/')
+        self.assert_same_output('/api/orders/my_orders/')
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'price': Decimal('9.90'),
+            'at': timezone.now(),
+            'text': 'Caf\u00e9 \u2028\u2029',
+            'nested': [{'n': 1, 'none': None, 'ok': True}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class SparseFieldsetTests(TenantAPITestCase):
+    """?fields= / ?omit= trim the output and the columns and joins behind it"""
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', description='Mechanical', price=Decimal('49.00'),
+            stock_quantity=10, sku='KB-1', created_by=self.owner
+        )
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, ' '.join(query['sql'] for query in queries)
+
+    def test_product_fields(self):
+        self.login(self.customer)
+        response, sql = self.get('/api/products/?fields=id,name,price')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'id': self.product.id, 'name': 'Keyboard', 'price': '49.00'}])
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('JOIN "users"', sql)
+
+    def test_product_omit(self):
+        self.login(self.customer)
+        response, sql = self.get(f'/api/products/{self.product.id}/?omit=description,created_by_username')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('description', response.data)
+        self.assertNotIn('created_by_username', response.data)
+        self.assertEqual(response.data['tenant_name'], 'Tech Store')
+        self.assertNotIn('"description"', sql)
+
+    def test_joined_field_is_loaded_with_the_rows(self):
+        self.login(self.customer)
+        response, sql = self.get('/api/products/?fields=name,created_by_username')
+        self.assertEqual(response.data['results'], [{'name': 'Keyboard', 'created_by_username': 'owner'}])
+        self.assertIn('JOIN "users"', sql)
+
+    def test_orders_skip_unrequested_items(self):
+        self.login(self.customer)
+        order = self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': 1}],
+            'shipping_address': '1 Main St',
+        }, format='json').data
+
+        response, sql = self.get('/api/orders/?fields=order_number,status')
+        self.assertEqual(response.data['results'], [{'order_number': order['order_number'], 'status': 'PENDING'}])
+        self.assertNotIn('GROUP BY', sql)
+
+        response, sql = self.get(f"/api/orders/{order['id']}/?omit=items")
+        self.assertNotIn('items', response.data)
+        self.assertNotIn('order_items', sql)
+
+    def test_unknown_field(self):
+        self.login(self.customer)
+        response = self.client.get('/api/products/?fields=id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'fields': ['Unknown field: secret']})
+
+
+class ProductImportTests(TenantAPITestCase):
+    """Bulk upserts from CSV / JSONL, matched on (tenant, sku)"""
+
+    def setUp(self):
+        super().setUp()
+        self.existing = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', description='Mechanical', price=Decimal('49.00'),
+            stock_quantity=10, sku='KB-1', created_by=self.owner
+        )
+        self.login(self.owner)
+
+    def post(self, body, content_type):
+        return self.client.generic('POST', '/api/products/bulk/', body.encode(), content_type=content_type)
+
+    def test_csv_upsert(self):
+        response = self.post(
+            'sku,name,price,stock_quantity\n'
+            'KB-1,Keyboard v2,59.00,\n'
+            'MS-1,Mouse,19.00,5\n'
+            'MS-2,Bad mouse,-1,5\n'
+            'MS-1,Mouse (dup),18.00,7\n',
+            'text/csv'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 4)
+        self.assertIn('price', response.data['errors'][0]['errors'])
+
+        self.existing.refresh_from_db()
+        # Columns missing from the row are left alone
+        self.assertEqual((self.existing.name, self.existing.price), ('Keyboard v2', Decimal('59.00')))
+        self.assertEqual((self.existing.stock_quantity, self.existing.description), (10, 'Mechanical'))
+
+        mouse = Product.objects.get(tenant=self.tenant, sku='MS-1')
+        self.assertEqual((mouse.name, mouse.stock_quantity, mouse.created_by), ('Mouse (dup)', 7, self.owner))
+
+    def test_jsonl_upload(self):
+        upload = SimpleUploadedFile(
+            'products.jsonl',
+            b'{"sku": "CB-1", "name": "Cable", "price": "4.50"}\n'
+            b'\n'
+            b'not json\n'
+            b'[1, 2]\n',
+            content_type='application/octet-stream'
+        )
+        response = self.client.post('/api/products/bulk/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertTrue(Product.objects.filter(tenant=self.tenant, sku='CB-1').exists())
+
+    def test_error_report_is_capped(self):
+        with override_settings(PRODUCT_IMPORT_MAX_ERRORS=2, PRODUCT_IMPORT_CHUNK_SIZE=2):
+            response = self.post('\n'.join(['sku,name,price'] + [f'X-{i},,1' for i in range(5)]), 'text/csv')
+        self.assertEqual(response.data['error_count'], 5)
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertTrue(response.data['errors_truncated'])
+
+    def test_unknown_format_and_role(self):
+        self.assertEqual(self.post('sku', 'text/plain').status_code, 400)
+
+        self.login(self.customer)
+        self.assertEqual(self.post('sku,name,price\nA,B,1\n', 'text/csv').status_code, 403)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as source:
+            source.write('sku,name,price\nKB-1,Keyboard v3,39.00\nHD-1,Headset,29.00\n')
+        self.addCleanup(os.remove, source.name)
+
+        out = StringIO()
+        call_command('import_products', source.name, '--tenant', 'techstore', stdout=out)
+        self.assertIn('Created 1, updated 1', out.getvalue())
+        self.assertEqual(Product.objects.filter(tenant=self.tenant).count(), 2)
+
+
+class OrderExportTests(TenantAPITestCase):
+    """Streaming CSV / JSONL export of a tenant's orders"""
+
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.objects.create(
+                tenant=self.tenant, name=f'Product {i}', price=Decimal('2.50'),
+                stock_quantity=100, sku=f'SKU-{i}', created_by=self.owner
+            )
+            for i in range(2)
+        ]
+        self.login(self.customer)
+        self.orders = [
+            self.client.post('/api/orders/', {
+                'items': [{'product': product.id, 'quantity': 2} for product in self.products[:count]],
+                'shipping_address': '=1 Main St',
+            }, format='json').data
+            for count in (1, 2, 2)
+        ]
+        self.login(self.owner)
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/orders/export/{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        with override_settings(ORDER_EXPORT_CHUNK_SIZE=2):
+            rows = list(csv.DictReader(StringIO(self.export())))
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(
+            [row['order_number'] for row in rows[:3]],
+            [self.orders[0]['order_number']] + [self.orders[1]['order_number']] * 2
+        )
+        self.assertEqual(
+            (rows[0]['customer'], rows[0]['product_sku'], rows[0]['subtotal']), ('customer', 'SKU-0', '5.00')
+        )
+        # Kept as text by spreadsheet apps
+        self.assertEqual(rows[0]['shipping_address'], "'=1 Main St")
+
+    def test_jsonl_with_filters(self):
+        Order.objects.filter(id=self.orders[0]['id']).update(status=Order.Status.CANCELLED)
+        Order.objects.filter(id=self.orders[2]['id']).update(created_at=timezone.now() + timedelta(days=2))
+
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        lines = self.export(f'?export_format=jsonl&status=PENDING&created_before={tomorrow}').splitlines()
+
+        self.assertEqual(len(lines), 1)
+        order = json.loads(lines[0])
+        self.assertEqual(order['order_number'], self.orders[1]['order_number'])
+        self.assertEqual([item['product_sku'] for item in order['items']], ['SKU-0', 'SKU-1'])
+        self.assertEqual(order['total_amount'], '10.00')
+
+    def test_two_queries_per_chunk(self):
+        response = self.client.get('/api/orders/export/')
+        with override_settings(ORDER_EXPORT_CHUNK_SIZE=2), self.assertNumQueries(4 + 1):
+            # Two chunks of orders + items, then the empty chunk that ends the export
+            b''.join(response.streaming_content)
+
+    def test_validation_and_role(self):
+        self.assertEqual(self.client.get('/api/orders/export/?export_format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/export/?created_after=yesterday').status_code, 400)
+
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, 403)
+
+
+class OrderStatusTransitionTests(TenantAPITestCase):
+    """Status changes follow Order.TRANSITIONS, one at a time or in batches"""
+
+    def setUp(self):
+        super().setUp()
+        product = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', price=Decimal('49.00'),
+            stock_quantity=100, sku='KB-1', created_by=self.owner
+        )
+        self.login(self.customer)
+        self.order_ids = [
+            self.client.post('/api/orders/', {
+                'items': [{'product': product.id, 'quantity': 1}],
+                'shipping_address': '1 Main St',
+            }, format='json').data['id']
+            for _ in range(4)
+        ]
+        self.login(self.owner)
+
+    def set_status(self, order_id, new_status):
+        return self.client.post(f'/api/orders/{order_id}/update_status/', {'status': new_status}, format='json')
+
+    def test_single_transition(self):
+        self.assertEqual(self.set_status(self.order_ids[0], 'SHIPPED').status_code, 400)
+        self.assertEqual(self.set_status(self.order_ids[0], 'CONFIRMED').data['status'], 'CONFIRMED')
+        self.assertEqual(self.set_status(self.order_ids[0], 'SHIPPED').data['status'], 'SHIPPED')
+
+        response = self.client.patch(f'/api/orders/{self.order_ids[0]}/', {'status': 'PENDING'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_by_ids(self):
+        first, second, third, _ = self.order_ids
+        self.set_status(third, 'CANCELLED')
+        other_tenant = Tenant.objects.create(store_name='Other', subdomain='other', contact_email='o@example.com')
+        foreign = Order.objects.create(
+            tenant=other_tenant, customer=self.customer, order_number='ORD-OTHER',
+            total_amount=Decimal('1.00'), shipping_address='x'
+        )
+
+        # user lookup + one SELECT and one UPDATE, inside a savepoint in tests
+        with self.assertNumQueries(1 + 2 + 2):
+            response = self.client.post('/api/orders/batch_status/', {
+                'status': 'CONFIRMED', 'ids': [first, second, third, foreign.id],
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [first, second])
+        self.assertEqual(
+            [(item['id'], item['status']) for item in response.data['rejected']],
+            [(third, 'CANCELLED'), (foreign.id, None)]
+        )
+        self.assertEqual(Order.objects.get(id=foreign.id).status, 'PENDING')
+
+    def test_batch_by_filter(self):
+        self.client.post('/api/orders/batch_status/', {
+            'status': 'CONFIRMED', 'ids': self.order_ids[:2],
+        }, format='json')
+
+        response = self.client.post('/api/orders/batch_status/', {
+            'status': 'SHIPPED', 'from_status': 'CONFIRMED',
+        }, format='json')
+        self.assertEqual(response.data['updated'], self.order_ids[:2])
+        self.assertEqual(Order.objects.filter(status='SHIPPED').count(), 2)
+
+    def test_batch_by_filter_skips_orders_placed_in_between(self):
+        update = QuerySet.update
+        late = []
+
+        def place_then_update(queryset, **kwargs):
+            if not late:
+                late.append(Order.objects.create(
+                    tenant=self.tenant, customer=self.customer, order_number='ORD-LATE',
+                    total_amount=Decimal('1.00'), shipping_address='x'
+                ))
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', place_then_update):
+            response = self.client.post('/api/orders/batch_status/', {
+                'status': 'CONFIRMED', 'from_status': 'PENDING',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], self.order_ids)
+        late[0].refresh_from_db()
+        self.assertEqual(late[0].status, 'PENDING')
+
+    def test_batch_validation_and_role(self):
+        response = self.client.post('/api/orders/batch_status/', {'status': 'SHIPPED'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.login(self.customer)
+        response = self.client.post('/api/orders/batch_status/', {
+            'status': 'CANCELLED', 'ids': self.order_ids,
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class SalesSummaryTests(TenantAPITestCase):
+    """Summary tables follow order creation, cancellation and deletion"""
+
+    def setUp(self):
+        super().setUp()
+        self.keyboard, self.mouse = [
+            Product.objects.create(
+                tenant=self.tenant, name=name, price=price,
+                stock_quantity=100, sku=name.upper(), created_by=self.owner
+            )
+            for name, price in (('Keyboard', Decimal('40.00')), ('Mouse', Decimal('10.00')))
+        ]
+        self.login(self.customer)
+        self.orders = [
+            self.client.post('/api/orders/', {
+                'items': items, 'shipping_address': '1 Main St',
+            }, format='json').data['id']
+            for items in (
+                [{'product': self.keyboard.id, 'quantity': 1}, {'product': self.mouse.id, 'quantity': 2}],
+                [{'product': self.mouse.id, 'quantity': 1}],
+                [{'product': self.keyboard.id, 'quantity': 2}],
+            )
+        ]
+        self.login(self.owner)
+
+    def report(self):
+        daily = self.client.get('/api/analytics/sales/daily/').data
+        products = self.client.get('/api/analytics/sales/products/').data['products']
+        return daily['totals'], [(row['product_sku'], row['units'], row['revenue']) for row in products]
+
+    def test_incremental_updates(self):
+        self.assertEqual(self.report(), (
+            {'order_count': 3, 'units': 6, 'revenue': '150.00'},
+            [('KEYBOARD', 3, '120.00'), ('MOUSE', 3, '30.00')],
+        ))
+
+        self.client.post('/api/orders/batch_status/', {
+            'status': 'CANCELLED', 'ids': self.orders[:2],
+        }, format='json')
+        self.client.delete(f'/api/orders/{self.orders[2]}/')
+        self.assertEqual(self.report(), ({'order_count': 0, 'units': 0, 'revenue': '0.00'}, []))
+
+    def test_rebuild_matches_incremental(self):
+        self.client.post(f'/api/orders/{self.orders[1]}/update_status/', {'status': 'CANCELLED'}, format='json')
+        incremental = self.report()
+
+        DailySales.objects.all().delete()
+        call_command('rebuild_sales_summary', '--tenant', 'techstore', stdout=StringIO())
+        self.assertEqual(self.report(), incremental)
+        self.assertEqual(incremental[0], {'order_count': 2, 'units': 5, 'revenue': '140.00'})
+
+    def test_admin_changes(self):
+        order_admin, item_admin = admin.site._registry[Order], admin.site._registry[OrderItem]
+
+        item = OrderItem.objects.get(order_id=self.orders[2])
+        item.quantity = 1
+        item_admin.save_model(None, item, None, change=True)
+        item_admin.delete_model(None, OrderItem.objects.get(order_id=self.orders[1]))
+        incremental = self.report()
+        # Order revenue is the order's total_amount, which item edits leave alone
+        self.assertEqual(incremental, (
+            {'order_count': 3, 'units': 4, 'revenue': '150.00'},
+            [('KEYBOARD', 2, '80.00'), ('MOUSE', 2, '20.00')],
+        ))
+        call_command('rebuild_sales_summary', '--tenant', 'techstore', stdout=StringIO())
+        self.assertEqual(self.report(), incremental)
+
+        order_admin.delete_model(None, Order.objects.get(id=self.orders[2]))
+        order_admin.delete_queryset(None, Order.objects.filter(id__in=self.orders[:2]))
+        self.assertEqual(self.report(), ({'order_count': 0, 'units': 0, 'revenue': '0.00'}, []))
+
+    def test_owner_only(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/analytics/sales/daily/').status_code, 403)
+
+
+@override_settings(TENANT_BASE_DOMAIN='shop.test', ALLOWED_HOSTS=['.shop.test', '.example.com'])
+class StorefrontTests(TenantAPITestCase):
+    """Anonymous catalog browsing, scoped by the Host header"""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(tenant=self.tenant, name='Keyboard', sku='KB-1', price='50.00', stock_quantity=3)
+        Product.objects.create(tenant=self.tenant, name='Old mouse', sku='MS-0', price='5.00', is_active=False)
+        other = Tenant.objects.create(store_name='Other', subdomain='other', contact_email='o@example.com')
+        Product.objects.create(tenant=other, name='Lamp', sku='LAMP', price='20.00')
+
+    def names(self, host):
+        response = self.client.get('/api/storefront/products/', HTTP_HOST=host)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_subdomain_and_domain(self):
+        self.assertEqual(self.names('techstore.shop.test'), ['Keyboard'])
+        self.assertEqual(self.names('techstore.example.com:8000'), ['Keyboard'])
+        self.assertEqual(self.names('other.shop.test'), ['Lamp'])
+        self.assertNotIn('created_by', self.client.get(
+            '/api/storefront/products/', HTTP_HOST='techstore.shop.test'
+        ).data['results'][0])
+
+    def test_unknown_host(self):
+        response = self.client.get('/api/storefront/products/', HTTP_HOST='nobody.shop.test')
+        self.assertEqual(response.status_code, 404)
+
+    def test_resolution_without_queries(self):
+        self.names('techstore.shop.test')
+
+        # Host lookup, tenant and products come from memory once cached
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('techstore.shop.test'), ['Keyboard'])
+
+        # Renamed tenants are applied to the table as they are saved
+        self.tenant.subdomain = 'gadgets'
+        self.tenant.save()
+        with self.assertNumQueries(0):
+            self.assertIsNone(tenant_host_map.resolve('techstore.shop.test'))
+            self.assertEqual(tenant_host_map.resolve('gadgets.shop.test').pk, self.tenant.pk)
+
+
+class ThrottlingTests(TenantAPITestCase):
+    """Token bucket rate limits per tenant and per user"""
+
+    def test_tenant_quota(self):
+        self.tenant.rate_limit = 1
+        self.tenant.burst_limit = 3
+        self.tenant.save()
+        self.login(self.owner)
+
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+        # Shared by every user of the tenant, other tenants have their own bucket
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/products/').status_code, 429)
+        other = Tenant.objects.create(store_name='Other', subdomain='other', contact_email='o@example.com')
+        other_owner = User.objects.create_user(
+            username='other', password=self.password, tenant=other, role=User.Role.STORE_OWNER
+        )
+        self.login(other_owner)
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+
+    def test_zero_limit_blocks_the_tenant(self):
+        self.tenant.rate_limit = 0
+        self.tenant.save()
+        self.login(self.owner)
+
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(response.has_header('Retry-After'))
+
+        # Empty fields use the settings defaults
+        self.tenant.rate_limit = None
+        self.tenant.save()
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+
+    @override_settings(USER_RATE_LIMITS={'CUSTOMER': (1, 2)})
+    def test_user_quota_by_role(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        self.assertEqual(self.client.get('/api/products/').status_code, 429)
+
+        # No quota for store owners here
+        self.login(self.owner)
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/products/').status_code, 200)
+
+    @override_settings(THROTTLE_LEASE_SECONDS=10)
+    def test_leases_share_the_bucket(self):
+        # Two processes leasing from one bucket never hand out more than the burst
+        first, second = RateLimiter(), RateLimiter()
+        allowed = 0
+        for _ in range(10):
+            allowed += first.acquire('test', 1, 4) == 0
+            allowed += second.acquire('test', 1, 4) == 0
+        self.assertEqual(allowed, 4)
+        self.assertGreater(second.acquire('test', 1, 4), 0)
+
+
+class IdempotencyKeyTests(TenantAPITestCase):
+    """Retrying order creation with an Idempotency-Key header"""
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Mouse', sku='MS-1', price='25.00', stock_quantity=5
+        )
+        self.login(self.customer)
+
+    def place(self, key, quantity=2):
+        return self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': quantity}],
+            'shipping_address': '1 Main St',
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_response(self):
+        first = self.place('retry-1')
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(2):
+            # The user and the stored response
+            again = self.place('retry-1')
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again.data, json.loads(json.dumps(first.data)))
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+
+        # A new key is a new order
+        self.assertEqual(self.place('retry-2').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_reused_key_and_failures(self):
+        self.assertEqual(self.place('key', quantity=9).status_code, 400)
+        # Errors are not stored, the key can be retried
+        self.assertEqual(self.place('key').status_code, 201)
+        response = self.place('key', quantity=1)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_request_in_progress(self):
+        self.place('busy')
+        now = timezone.now()
+        IdempotencyKey.objects.filter(key='busy').update(
+            status_code=None, response_body=None, locked_until=now + timedelta(seconds=30)
+        )
+        response = self.place('busy')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # A claim left behind by a request that died is taken over
+        IdempotencyKey.objects.filter(key='busy').update(locked_until=now)
+        response = self.place('busy')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get(key='busy').response_body['id'], response.data['id'])
+
+    def test_purge_expired_keys(self):
+        self.place('old')
+        self.place('new')
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now())
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Deleted 1 expired', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class OrderNumberTests(TenantAPITestCase):
+    """Order numbers from per-tenant sequences or time-ordered ids"""
+
+    def place(self):
+        # Blocks taken inside a transaction are only reused once it commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', {
+                'items': [{'product': self.product.id, 'quantity': 1}],
+                'shipping_address': '1 Main St',
+            }, format='json').data['order_number']
+
+    def test_sequence_per_tenant(self):
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Mouse', sku='MS-1', price='25.00', stock_quantity=5
+        )
+        self.login(self.customer)
+        self.assertEqual([self.place(), self.place()], ['ORD-0000000001', 'ORD-0000000002'])
+
+        other = Tenant.objects.create(store_name='Other', subdomain='other', contact_email='o@example.com')
+        other_customer = User.objects.create_user(username='other', password=self.password, tenant=other)
+        self.product = Product.objects.create(tenant=other, name='Lamp', sku='LAMP', price='20.00', stock_quantity=5)
+        self.login(other_customer)
+        self.assertEqual(self.place(), 'ORD-0000000001')
+
+    def test_blocks_are_shared_once_committed(self):
+        generator = SequenceOrderNumberGenerator(block_size=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            # Not committed yet: each call takes a block of its own
+            self.assertEqual(generator.next_number(self.tenant.id), 'ORD-0000000001')
+            self.assertEqual(generator.next_number(self.tenant.id), 'ORD-0000000011')
+        self.assertEqual(OrderNumberSequence.objects.get(tenant=self.tenant).last_value, 20)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(generator.next_number(self.tenant.id), 'ORD-0000000012')
+
+    @override_settings(ORDER_NUMBER_GENERATOR='core.ordernumbers.TimeOrderedOrderNumberGenerator')
+    def test_time_ordered(self):
+        numbers = [get_generator().next_number(self.tenant.id) for _ in range(1000)]
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertEqual(len(numbers[0]), len('ORD-') + 16)
+
+
+class StressDatabaseMixin:
+    """
+    A 'stress' shard on a SQLite file database for tests running many threads:
+    in-memory test databases fail concurrent writes instead of waiting for the lock.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['stress'] = dict(
+            connections.settings['default'], NAME=os.path.join(cls.directory.name, 'stress.sqlite3')
+        )
+        call_command('migrate', database='stress', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['stress'].close()
+        del connections['stress']
+        del connections.settings['stress']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def create_stress_tenant(self, index):
+        tenant = Tenant.objects.create(
+            store_name=f'Store {index}', subdomain=f'store{index}', contact_email='s@example.com', db_alias='stress'
+        )
+        # Rows on a shard reference the tenant's copy there
+        tenant.save(using='stress')
+        tenant_registry.get(tenant.id)
+        return tenant
+
+    def run_threads(self, target, args_list):
+        """Run target(*args) in one thread per args, return the exceptions raised"""
+        errors = []
+
+        def worker(*args):
+            try:
+                target(*args)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=args) for args in args_list]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+
+@override_settings(TENANT_SHARDS=['stress'])
+class OrderNumberConcurrencyTests(StressDatabaseMixin, TransactionTestCase):
+    """Sequences allocated from many threads and 'processes' at once"""
+
+    def test_numbers_are_unique(self):
+        tenant_registry.clear()
+        tenants = [self.create_stress_tenant(i) for i in range(2)]
+
+        # Two generators stand in for two processes; tiny blocks force frequent allocations
+        generators = [SequenceOrderNumberGenerator(block_size=3) for _ in range(2)]
+        numbers = {tenant.id: [] for tenant in tenants}
+
+        def worker(generator, tenant_id):
+            for _ in range(30):
+                numbers[tenant_id].append(generator.next_number(tenant_id))
+
+        errors = self.run_threads(worker, [(generators[i % 2], tenants[i // 4].id) for i in range(8)])
+        self.assertEqual(errors, [])
+        for tenant in tenants:
+            self.assertEqual(len(numbers[tenant.id]), 120)
+            self.assertEqual(len(set(numbers[tenant.id])), 120)
+            # Every number comes from a block the sequence row handed out
+            last_value = OrderNumberSequence.objects.using('stress').get(tenant=tenant).last_value
+            self.assertLessEqual(max(numbers[tenant.id]), f'ORD-{last_value:010d}')
+
+
+class InventoryTests(TenantAPITestCase):
+    """Conditional stock decrements, their failure report and metrics"""
+
+    def setUp(self):
+        super().setUp()
+        inventory_metrics.reset()
+        self.keyboard, self.mouse = [
+            Product.objects.create(
+                tenant=self.tenant, name=name, price=Decimal('10.00'),
+                stock_quantity=stock, sku=name.upper(), created_by=self.owner
+            )
+            for name, stock in (('Keyboard', 5), ('Mouse', 2))
+        ]
+
+    def stock(self):
+        return list(Product.objects.order_by('id').values_list('stock_quantity', flat=True))
+
+    def test_competing_orders_cannot_oversell(self):
+        self.login(self.customer)
+        statuses = [
+            self.client.post('/api/orders/', {
+                'items': [{'product': self.keyboard.id, 'quantity': 2}],
+                'shipping_address': '1 Main St',
+            }, format='json').status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [201, 201, 400])
+        self.assertEqual(self.stock(), [1, 2])
+
+    def test_failed_lists_the_short_lines(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            decrement_stock(self.tenant.id, {self.keyboard.id: 5, self.mouse.id: 3, 999999: 1})
+        self.assertEqual(raised.exception.failed, {self.mouse.id: 2, 999999: 0})
+        self.assertEqual(self.stock(), [5, 2])
+
+    def test_duplicate_lines_are_summed(self):
+        self.login(self.customer)
+        response = self.client.post('/api/orders/', {
+            'items': [
+                {'product': self.mouse.id, 'quantity': 1},
+                {'product': self.keyboard.id, 'quantity': 1},
+                {'product': self.mouse.id, 'quantity': 2},
+            ],
+            'shipping_address': '1 Main St',
+        }, format='json')
+        # Each mouse line fits on its own, together they do not
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'], ['Insufficient stock for Mouse'])
+        self.assertEqual(self.stock(), [5, 2])
+
+    def test_metrics(self):
+        decrement_stock(self.tenant.id, {self.keyboard.id: 1})
+        with self.assertRaises(InsufficientStock):
+            decrement_stock(self.tenant.id, {self.mouse.id: 3})
+
+        # A lock timeout is retried
+        update = mock.patch('django.db.models.QuerySet.update', side_effect=[OperationalError('locked'), 1])
+        with update, mock.patch('core.inventory.time.sleep') as sleep:
+            decrement_stock(self.tenant.id, {self.mouse.id: 1})
+        sleep.assert_called_once()
+
+        self.assertEqual(inventory_metrics.snapshot(), {self.tenant.id: {
+            'attempts': 4, 'committed': 2, 'insufficient': 1, 'contention': 1, 'retries': 1,
+        }})
+
+
+class StockReservationTests(TenantAPITestCase):
+    """Holds take stock out straight away and give it back unless confirmed"""
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', price=Decimal('10.00'),
+            stock_quantity=10, sku='KB-1', created_by=self.owner
+        )
+        self.login(self.customer)
+
+    def reserve(self, quantity, **extra):
+        return self.client.post('/api/reservations/', {
+            'product': self.product.id, 'quantity': quantity, **extra
+        }, format='json')
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def expire(self, *ids):
+        StockReservation.objects.filter(id__in=ids).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_reserve_and_release(self):
+        response = self.reserve(3, ttl_seconds=60)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['status'], response.data['product_name']), ('HELD', 'Keyboard'))
+        self.assertEqual(self.stock(), 7)
+
+        reservation = StockReservation.objects.get(id=response.data['id'])
+        self.assertEqual(str(reservation), f'3 x product {self.product.id} held for {self.customer.id} (HELD)')
+        self.assertAlmostEqual(
+            (reservation.expires_at - reservation.created_at).total_seconds(), 60, delta=1
+        )
+
+        url = f"/api/reservations/{response.data['id']}/"
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.stock(), 10)
+        # Released once only
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.stock(), 10)
+
+    def test_validation_and_role(self):
+        self.assertEqual(self.reserve(11).status_code, 400)
+        with override_settings(RESERVATION_MAX_TTL=60):
+            self.assertEqual(self.reserve(1, ttl_seconds=61).status_code, 400)
+        self.assertEqual(self.stock(), 10)
+
+        self.login(self.owner)
+        self.assertEqual(self.reserve(1).status_code, 403)
+
+    def test_only_own_reservations_are_listed(self):
+        self.reserve(1)
+        other = User.objects.create_user(
+            username='other', password=self.password, tenant=self.tenant, role=User.Role.CUSTOMER
+        )
+        self.login(other)
+        self.reserve(2)
+
+        response = self.client.get('/api/reservations/')
+        self.assertEqual([row['quantity'] for row in response.data['results']], [2])
+
+    def test_confirm(self):
+        ids = [self.reserve(quantity).data['id'] for quantity in (2, 3)]
+
+        response = self.client.post('/api/reservations/confirm/', {
+            'reservations': ids, 'shipping_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_amount'], '50.00')
+        self.assertEqual(sorted(item['quantity'] for item in response.data['items']), [2, 3])
+        # Stock was taken by the holds
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(
+            set(StockReservation.objects.values_list('status', 'order_id')),
+            {('CONFIRMED', response.data['id'])}
+        )
+
+        # Confirmed holds can be neither confirmed again nor released
+        response = self.client.post('/api/reservations/confirm/', {
+            'reservations': ids[:1], 'shipping_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.delete(f'/api/reservations/{ids[0]}/').status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_holds_cannot_be_confirmed(self):
+        held, expired = [self.reserve(1).data['id'] for _ in range(2)]
+        self.expire(expired)
+
+        response = self.client.post('/api/reservations/confirm/', {
+            'reservations': [held, expired], 'shipping_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['reservations'], [f'Reservation {expired} is expired or no longer held'])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(StockReservation.objects.get(id=held).status, 'HELD')
+
+    def test_sweeper_releases_expired_holds(self):
+        ids = [self.reserve(quantity).data['id'] for quantity in (1, 2, 3)]
+        self.expire(*ids[:2])
+
+        out = StringIO()
+        call_command('release_expired_reservations', '--batch-size', '1', stdout=out)
+        self.assertIn('Released 2 expired reservations', out.getvalue())
+        self.assertEqual(self.stock(), 7)
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('id', 'status')),
+            {ids[0]: 'RELEASED', ids[1]: 'RELEASED', ids[2]: 'HELD'}
+        )
+        self.assertEqual(release_expired_reservations(), 0)
+
+    def test_sweeper_skips_holds_taken_before(self):
+        ids = [self.reserve(quantity).data['id'] for quantity in (1, 2, 3)]
+        self.expire(*ids)
+        release_reservation(StockReservation.objects.get(id=ids[0]))
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=QuerySet.update) as update:
+            self.assertEqual(release_expired_reservations(), 2)
+
+        # The holds UPDATE only touches the ids the sweep read
+        holds = update.call_args_list[0].args[0]
+        self.assertEqual(set(holds.values_list('id', flat=True)), set(ids[1:]))
+        # Every unit is given back exactly once
+        self.assertEqual(self.stock(), 10)
+        self.assertEqual(set(StockReservation.objects.values_list('status', flat=True)), {'RELEASED'})
+
+
+@override_settings(TENANT_SHARDS=['stress'])
+class InventoryConcurrencyTests(StressDatabaseMixin, TransactionTestCase):
+    """Many threads ordering the last units at once"""
+
+    def test_stock_never_goes_below_zero(self):
+        tenant_registry.clear()
+        tenant = self.create_stress_tenant(0)
+        product = Product.objects.using('stress').create(
+            tenant=tenant, name='Keyboard', sku='KB-1', price='10.00', stock_quantity=10
+        )
+        sold = []
+
+        def worker():
+            with use_tenant_database('stress'):
+                for _ in range(3):
+                    try:
+                        decrement_stock(tenant.id, {product.id: 1})
+                    except InsufficientStock:
+                        continue
+                    sold.append(1)
+
+        errors = self.run_threads(worker, [()] * 8)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sold), 10)
+        self.assertEqual(Product.objects.using('stress').get(pk=product.pk).stock_quantity, 0)
+
+
+class WebhookReceiver(ThreadingHTTPServer):
+    """Local stand-in for a tenant's webhook endpoint, answering with the queued statuses (then 200)"""
+
+    def __init__(self):
+        self.received = []
+        self.statuses = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(handler):
+                body = handler.rfile.read(int(handler.headers['Content-Length']))
+                self.received.append((dict(handler.headers), body))
+                handler.send_response(self.statuses.pop(0) if self.statuses else 200)
+                handler.end_headers()
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/hook'
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def events(self):
+        return [json.loads(body) for _, body in self.received]
+
+
+class OutboxTests(TenantAPITestCase):
+    """Order events written with the orders and sent to the tenant's webhook"""
+
+    def setUp(self):
+        super().setUp()
+        self.receiver = WebhookReceiver()
+        self.addCleanup(self.receiver.stop)
+        self.tenant.webhook_url = self.receiver.url
+        self.tenant.webhook_secret = 'shh'
+        self.tenant.save()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Mouse', sku='MS-1', price='25.00', stock_quantity=5
+        )
+
+    def place_and_ship(self):
+        self.login(self.customer)
+        order_id = self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': 1}],
+            'shipping_address': '1 Main St',
+        }, format='json').data['id']
+        self.login(self.owner)
+        response = self.client.post(f'/api/orders/{order_id}/update_status/', {'status': 'CONFIRMED'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return order_id
+
+    def test_events_are_delivered_in_order(self):
+        order_id = self.place_and_ship()
+        self.assertEqual(OutboxEvent.objects.filter(status=OutboxEvent.Status.PENDING).count(), 2)
+
+        counts = process_outbox()
+        self.assertEqual(counts['delivered'], 2)
+
+        events = self.receiver.events()
+        self.assertEqual([event['type'] for event in events], ['order.created', 'order.status_changed'])
+        self.assertEqual(events[0]['data']['order']['id'], order_id)
+        self.assertEqual(
+            events[1]['data']['order'], {'id': order_id, 'status': 'CONFIRMED', 'previous_status': 'PENDING'}
+        )
+
+        headers, body = self.receiver.received[0]
+        expected = hmac.new(b'shh', body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers['X-Webhook-Signature'], f'sha256={expected}')
+
+        self.assertFalse(OutboxEvent.objects.exclude(status=OutboxEvent.Status.DELIVERED).exists())
+        self.assertEqual(process_outbox()['delivered'], 0)
+
+    def test_failures_are_retried_with_backoff(self):
+        self.place_and_ship()
+        self.receiver.statuses = [500]
+
+        counts = process_outbox()
+        self.assertEqual((counts['delivered'], counts['retried']), (0, 1))
+        first, second = OutboxEvent.objects.order_by('id')
+        self.assertEqual((first.attempts, second.attempts), (1, 0))
+        self.assertIn('500', first.last_error)
+        # The second event waits for the first
+        self.assertEqual(first.next_attempt_at, second.next_attempt_at)
+
+        # Not due yet
+        self.assertEqual(process_outbox()['delivered'], 0)
+        counts = process_outbox(now=first.next_attempt_at)
+        self.assertEqual(counts['delivered'], 2)
+        self.assertEqual([event['type'] for event in self.receiver.events()],
+                         ['order.created', 'order.created', 'order.status_changed'])
+
+    def place(self):
+        self.login(self.customer)
+        return self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': 1}],
+            'shipping_address': '1 Main St',
+        }, format='json').data['id']
+
+    def test_newer_events_wait_for_one_backing_off(self):
+        self.place_and_ship()
+        self.receiver.statuses = [500]
+        process_outbox()
+        retry_at = OutboxEvent.objects.order_by('id').first().next_attempt_at
+
+        # Written after the failure and due at once, but behind the failed event
+        self.place()
+        self.assertEqual(process_outbox()['delivered'], 0)
+
+        self.assertEqual(process_outbox(now=retry_at)['delivered'], 3)
+        events = self.receiver.events()[1:]
+        self.assertEqual([event['type'] for event in events],
+                         ['order.created', 'order.status_changed', 'order.created'])
+        self.assertEqual([event['id'] for event in events], sorted(event['id'] for event in events))
+
+    def test_one_worker_per_tenant(self):
+        self.place_and_ship()
+        other = Tenant.objects.create(
+            store_name='Other', subdomain='other', contact_email='o@example.com', webhook_url=self.receiver.url
+        )
+        other_customer = User.objects.create_user(username='other', password=self.password, tenant=other)
+        self.product = Product.objects.create(tenant=other, name='Lamp', sku='LAMP', price='20.00', stock_quantity=5)
+        self.login(other_customer)
+        self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': 1}],
+            'shipping_address': '1 Main St',
+        }, format='json')
+
+        # Another worker holds the oldest event of the first tenant
+        now = timezone.now()
+        claimed = _claim('default', 1, now)
+        self.assertEqual([event.tenant_id for event in claimed], [self.tenant.id])
+
+        # This one skips the rest of that tenant's queue but serves the other tenant
+        self.assertEqual(process_outbox(now=now)['delivered'], 1)
+        self.assertEqual(OutboxEvent.objects.filter(tenant=self.tenant, status='PENDING').count(), 2)
+
+        # Once the claim runs out the first tenant's events go, oldest first
+        expired = now + timedelta(seconds=settings.OUTBOX_CLAIM_SECONDS)
+        self.assertEqual(process_outbox(now=expired)['delivered'], 2)
+        self.assertEqual([event['type'] for event in self.receiver.events()[1:]],
+                         ['order.created', 'order.status_changed'])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_gives_up_after_max_attempts(self):
+        self.place_and_ship()
+        self.receiver.statuses = [500]
+        counts = process_outbox()
+        self.assertEqual((counts['failed'], counts['delivered']), (1, 1))
+
+    def test_no_events_without_webhook(self):
+        self.tenant.webhook_url = ''
+        self.tenant.save()
+        self.place_and_ship()
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        out = StringIO()
+        call_command('process_outbox', stdout=out)
+        self.assertIn('Delivered 0 events', out.getvalue())
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    READ_REPLICA_ALIAS='replica', REPLICA_PIN_SECONDS=60,
+)
+class ReadReplicaTests(TenantFixtureMixin, APITransactionTestCase):
+    """
+    A second in-memory SQLite database plays the replica. It only sees the
+    primary's changes when sync_replica() copies them over, so stale reads
+    show which database a request used.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test database setup, which would create and flush it
+        connections.settings['replica'] = dict(
+            connections.settings['default'], NAME='file:replica?mode=memory&cache=shared'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        del connections['replica']
+        del connections.settings['replica']
+        super().tearDownClass()
+
+    def sync_replica(self):
+        for alias in ('default', 'replica'):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(connections['replica'].connection)
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', sku='KEYBOARD', price='50.00', stock_quantity=10
+        )
+        self.sync_replica()
+
+    def order_numbers(self):
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        return [order['order_number'] for order in response.data['results']]
+
+    def place_order(self):
+        response = self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': 1}],
+            'shipping_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['order_number']
+
+    def test_reads_go_to_replica(self):
+        self.login(self.customer)
+        self.place_order()
+        self.login(self.owner)
+
+        # The owner did not write - the order is only on the primary so far
+        self.assertEqual(self.order_numbers(), [])
+        self.sync_replica()
+        self.assertEqual(len(self.order_numbers()), 1)
+
+    def test_writer_reads_own_writes(self):
+        self.login(self.customer)
+        order_number = self.place_order()
+
+        # Pinned to the primary after the write, though the replica lags
+        self.assertEqual(self.order_numbers(), [order_number])
+        cache.clear()
+        self.assertEqual(self.order_numbers(), [])
+
+    def test_writes_go_to_primary(self):
+        self.login(self.owner)
+        response = self.client.patch(f'/api/products/{self.product.id}/', {'price': '45.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Product.objects.using('default').get(pk=self.product.pk).price, Decimal('45.00'))
+        self.assertEqual(Product.objects.using('replica').get(pk=self.product.pk).price, Decimal('50.00'))
+
+    def test_catalog_cache_skips_lagging_reads(self):
+        self.login(self.owner)
+        self.client.patch(f'/api/products/{self.product.id}/', {'price': '45.00'}, format='json')
+
+        # Another user reads the lagging replica right after the change
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/products/').data['results'][0]['price'], '50.00')
+        self.sync_replica()
+        self.assertEqual(self.client.get('/api/products/').data['results'][0]['price'], '45.00')
+
+    def test_list_etag_skipped_for_lagging_reads(self):
+        # The product created in setUp is on the replica already
+        cache.clear()
+        self.login(self.customer)
+        etag = self.client.get('/api/products/')['ETag']
+        self.login(self.owner)
+        self.client.patch(f'/api/products/{self.product.id}/', {'price': '45.00'}, format='json')
+
+        # The replica still has the old price: no 304, and no new ETag for the old body
+        self.login(self.customer)
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['price'], '50.00')
+        self.assertFalse(response.has_header('ETag'))
+
+        # Pinned to the primary, the writer still gets validators
+        self.login(self.owner)
+        self.client.patch(f'/api/products/{self.product.id}/', {'price': '40.00'}, format='json')
+        self.assertTrue(self.client.get('/api/products/').has_header('ETag'))
+
+    def test_order_list_etag_skipped_for_lagging_reads(self):
+        self.login(self.owner)
+        self.assertTrue(self.client.get('/api/orders/').has_header('ETag'))
+        self.login(self.customer)
+        self.place_order()
+
+        self.login(self.owner)
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.data['results'], [])
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    TENANT_SHARDS=['shard1'],
+)
+class TenantShardTests(TenantFixtureMixin, APITransactionTestCase):
+    """The tenant starts on the default database and is moved to shard1, an in-memory SQLite database"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test database setup, which would create and flush it
+        connections.settings['shard1'] = dict(
+            connections.settings['default'], NAME='file:shard1?mode=memory&cache=shared'
+        )
+        call_command('migrate', database='shard1', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        del connections['shard1']
+        del connections.settings['shard1']
+        super().tearDownClass()
+
+    def tearDown(self):
+        call_command('flush', database='shard1', interactive=False, verbosity=0)
+        super().tearDown()
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Keyboard', sku='KEYBOARD', price='50.00', stock_quantity=10
+        )
+
+    def place_order(self):
+        response = self.client.post('/api/orders/', {
+            'items': [{'product': self.product.id, 'quantity': 1}],
+            'shipping_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def move(self, database):
+        call_command('move_tenant_shard', 'techstore', database, '--wait', '0', stdout=StringIO())
+        self.tenant.refresh_from_db()
+
+    def counts(self, using):
+        return [
+            model.objects.using(using).filter(tenant=self.tenant).count()
+            for model in (User, Product, Order, DailySales)
+        ]
+
+    def test_move_and_route(self):
+        self.login(self.customer)
+        first_order = self.place_order()
+
+        self.move('shard1')
+        self.assertEqual(self.tenant.db_alias, 'shard1')
+        self.assertEqual(self.counts('shard1'), [2, 1, 1, 1])
+        self.assertEqual(self.counts('default'), [0, 0, 0, 0])
+
+        # Ids are kept, so the token issued before the move still works
+        response = self.client.get('/api/orders/')
+        self.assertEqual([order['id'] for order in response.data['results']], [first_order])
+
+        # New rows get ids from the shard's block
+        second_order = self.place_order()
+        self.assertGreater(second_order, 10 ** 12)
+        self.assertEqual(self.counts('shard1'), [2, 1, 2, 1])
+        self.assertEqual(Product.objects.using('shard1').get(pk=self.product.pk).stock_quantity, 8)
+
+        self.login(self.owner)
+        response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_register_on_shard(self):
+        self.move('shard1')
+        response = self.client.post('/api/auth/register/', {
+            'username': 'newcustomer', 'password': 'S3cure-pass!', 'password2': 'S3cure-pass!',
+            'email': 'new@example.com', 'tenant': self.tenant.id, 'role': User.Role.CUSTOMER,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.using('shard1').filter(username='newcustomer').exists())
+        self.assertFalse(User.objects.using('default').filter(username='newcustomer').exists())
+
+        response = self.client.post('/api/auth/login/', {
+            'username': 'newcustomer', 'password': 'S3cure-pass!', 'tenant': self.tenant.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['tenant_id'], self.tenant.id)
+
+    def test_move_back(self):
+        self.login(self.customer)
+        self.place_order()
+        self.move('shard1')
+        self.move('default')
+
+        self.assertEqual(self.counts('default'), [2, 1, 1, 1])
+        self.assertEqual(self.counts('shard1'), [0, 0, 0, 0])
+        self.assertFalse(Tenant.objects.using('shard1').exists())
+        self.assertEqual(len(self.client.get('/api/orders/').data['results']), 1)
+
+    def test_unknown_database(self):
+        with self.assertRaises(CommandError):
+            self.move('shard2')
+
+    @override_settings(TENANT_CACHE_TTL=30)
+    def test_writes_are_refused_while_moving(self):
+        self.login(self.customer)
+        during_wait = []
+
+        def sleep(seconds):
+            # What a request sees while the command waits for other processes
+            during_wait.append((
+                seconds,
+                self.client.get('/api/orders/').status_code,
+                self.client.post('/api/orders/', {
+                    'items': [{'product': self.product.id, 'quantity': 1}],
+                    'shipping_address': '1 Main St',
+                }, format='json').status_code,
+            ))
+
+        out = StringIO()
+        with mock.patch('core.sharding.time.sleep', side_effect=sleep):
+            call_command('move_tenant_shard', 'techstore', 'shard1', stdout=out)
+
+        # Read-only before copying; moved and writable before the old rows go
+        self.assertEqual(during_wait, [(30, 200, 403), (30, 200, 201)])
+        self.assertIn('waiting 30s', out.getvalue())
+        self.tenant.refresh_from_db()
+        self.assertEqual((self.tenant.db_alias, self.tenant.is_read_only), ('shard1', False))
+        self.assertEqual(self.counts('shard1'), [2, 1, 1, 1])
+
+    def test_updates_while_copying_abort_the_move(self):
+        copy_rows = sharding._copy_rows
+
+        def copy_then_update(model, *args, **kwargs):
+            copied = copy_rows(model, *args, **kwargs)
+            if model is Product:
+                # Same row count, different content
+                Product.objects.using('default').filter(pk=self.product.pk).update(stock_quantity=3)
+            return copied
+
+        with mock.patch('core.sharding._copy_rows', side_effect=copy_then_update):
+            with self.assertRaisesMessage(CommandError, 'products of Tech Store changed while copying'):
+                self.move('shard1')
+
+        self.assertEqual((self.tenant.db_alias, self.tenant.is_read_only), ('default', False))
+        self.assertEqual(self.counts('shard1'), [0, 0, 0, 0])
+        self.assertEqual(Product.objects.using('default').get(pk=self.product.pk).stock_quantity, 3)
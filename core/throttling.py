@@ -0,0 +1,173 @@
+"""
+Per-tenant and per-user request rate limits with token buckets.
+
+A bucket holds up to `burst` tokens and refills at `rate` tokens per second;
+every request takes one. Buckets are shared by all processes through
+Django's cache (THROTTLE_CACHE_ALIAS). A process does not go to the cache
+for every request: it leases a few tokens at a time (what the bucket
+refills in THROTTLE_LEASE_SECONDS) and hands them out from memory, and once
+denied it keeps denying locally until the bucket has refilled. Tokens left
+in an expired lease are dropped, so a process never uses more than it took.
+
+TenantRateThrottle keys on the tenant TenantMiddleware resolved (JWT claim
+or storefront host), with quotas from Tenant.rate_limit/burst_limit or
+TENANT_RATE_LIMIT/TENANT_BURST_LIMIT. UserRateThrottle keys on the user
+with quotas per role from USER_RATE_LIMITS. DRF answers denied requests
+with 429 and a Retry-After header.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+# Shared buckets restart full after this long, see SharedBuckets.take
+BUCKET_TTL = 3600
+
+
+class SharedBuckets:
+    """
+    Token buckets in the cache, using only add and incr so any backend works.
+
+    A bucket is the time it was started and the number of tokens taken
+    since; the tokens available are burst + rate * elapsed - taken, capped
+    at burst by counting refills beyond a full bucket as taken.
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def take(self, key, rate, burst, count):
+        """Take up to `count` tokens. Returns (tokens taken, seconds until one is available)."""
+        now = time.time()
+        start_key = f'throttle:{key}:start'
+        started = self.cache.get(start_key)
+        if started is None:
+            self.cache.add(start_key, now, timeout=BUCKET_TTL)
+            started = self.cache.get(start_key, now)
+
+        # Tied to the start time, so a bucket never outlives its start
+        taken_key = f'throttle:{key}:{started}'
+        self.cache.add(taken_key, 0, timeout=BUCKET_TTL * 2)
+        try:
+            taken = self.cache.incr(taken_key, count)
+        except ValueError:
+            # Evicted in between - start counting again
+            self.cache.add(taken_key, count, timeout=BUCKET_TTL * 2)
+            taken = count
+
+        capacity = burst + rate * (now - started)
+        granted = min(count, math.floor(capacity - (taken - count)))
+        if granted < count:
+            self.cache.decr(taken_key, count - max(granted, 0))
+        if granted <= 0:
+            return 0, (taken - count + 1 - capacity) / rate
+
+        unused = capacity - (taken - count) - burst
+        if unused >= 1:
+            # Refills beyond a full bucket are lost
+            self.cache.incr(taken_key, math.floor(unused))
+        return granted, 0.0
+
+
+class _Lease:
+    __slots__ = ['tokens', 'expires_at', 'blocked_until']
+
+    def __init__(self, tokens=0, expires_at=0.0, blocked_until=0.0):
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.blocked_until = blocked_until
+
+
+class RateLimiter:
+    """In-process leases on the shared buckets"""
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or SharedBuckets()
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, rate, burst):
+        """Take one token. Returns 0 when allowed, else the seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None:
+                if lease.tokens > 0 and lease.expires_at > now:
+                    lease.tokens -= 1
+                    return 0.0
+                if lease.blocked_until > now:
+                    return lease.blocked_until - now
+
+        lease_seconds = getattr(settings, 'THROTTLE_LEASE_SECONDS', 0.1)
+        size = max(1, min(burst, int(rate * lease_seconds)))
+        granted, wait = self.buckets.take(key, rate, burst, size)
+
+        with self._lock:
+            if granted:
+                self._leases[key] = _Lease(granted - 1, now + lease_seconds)
+                return 0.0
+            self._leases[key] = _Lease(blocked_until=now + wait)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._leases.clear()
+
+
+rate_limiter = RateLimiter()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class: subclasses return the bucket key and its (rate, burst), or None to skip"""
+
+    def get_bucket(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'THROTTLE_ENABLED', True):
+            return True
+
+        bucket = self.get_bucket(request, view)
+        if bucket is None:
+            return True
+
+        key, (rate, burst) = bucket
+        if rate <= 0 or burst <= 0:
+            # A quota of 0 blocks every request, there is nothing to wait for
+            self.wait_seconds = None
+            return False
+
+        self.wait_seconds = rate_limiter.acquire(key, rate, burst)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class TenantRateThrottle(TokenBucketThrottle):
+    """Requests of a tenant, whoever makes them"""
+
+    def get_bucket(self, request, view):
+        tenant = getattr(request._request, 'tenant', None)
+        if tenant is None:
+            return None
+        # An explicit 0 blocks the tenant, only empty fields fall back to the defaults
+        return f'tenant:{tenant.id}', (
+            settings.TENANT_RATE_LIMIT if tenant.rate_limit is None else tenant.rate_limit,
+            settings.TENANT_BURST_LIMIT if tenant.burst_limit is None else tenant.burst_limit,
+        )
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    """Requests of one user, with quotas by role"""
+
+    def get_bucket(self, request, view):
+        user = request.user
+        quota = settings.USER_RATE_LIMITS.get(getattr(user, 'role', None))
+        if not user.is_authenticated or quota is None:
+            return None
+        return f'user:{user.id}', quota
@@ -3,13 +3,17 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     RegisterView, CustomTokenObtainPairView,
-    TenantViewSet, ProductViewSet, OrderViewSet
+    TenantViewSet, ProductViewSet, OrderViewSet, StockReservationViewSet,
+    SalesAnalyticsViewSet, StorefrontProductViewSet
 )
 
 router = DefaultRouter()
 router.register(r'tenants', TenantViewSet, basename='tenant')
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'orders', OrderViewSet, basename='order')
+router.register(r'reservations', StockReservationViewSet, basename='reservation')
+router.register(r'analytics/sales', SalesAnalyticsViewSet, basename='sales-analytics')
+router.register(r'storefront/products', StorefrontProductViewSet, basename='storefront-product')
 
 urlpatterns = [
     # Authentication endpoints
@@ -1,24 +1,64 @@
-from rest_framework import viewsets, status, generics
+from rest_framework import viewsets, status, generics, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView
-from django.db.models import Q
-import uuid
-
-from .models import Tenant, User, Product, Order, OrderItem
+from django.db import router
+from django.db.models import Count, Prefetch, Sum, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .caching import CatalogCacheMixin, catalog_cache, order_versions
+from .conditional import ConditionalGetMixin
+from .exports import CONTENT_TYPES, FORMATS, iter_order_chunks, parse_bound, stream_csv, stream_jsonl
+from .fieldsets import project_queryset
+from .idempotency import IdempotentCreateMixin
+from .imports import detect_format, import_products
+from .models import Tenant, User, Product, Order, OrderItem, StockReservation, DailySales, ProductDailySales
 from .serializers import (
     TenantSerializer, UserSerializer, RegisterSerializer,
     CustomTokenObtainPairSerializer, ProductSerializer,
-    OrderSerializer, OrderListSerializer
+    OrderSerializer, OrderListSerializer, OrderBatchStatusSerializer,
+    StockReservationSerializer, ReservationConfirmSerializer,
+    SalesQuerySerializer, DailySalesSerializer, ProductSalesSerializer, StorefrontProductSerializer
 )
+from .pagination import KeysetPagination
+from .rendering import FastListMixin
+from .routers import db_for_tenant, use_tenant_database
 from .permissions import (
-    IsTenantUser, IsStoreOwner, IsStoreOwnerOrStaff,
+    IsTenantUser, IsStoreOwner, IsStoreOwnerOrStaff, IsCustomer,
     TenantProductPermission, TenantOrderPermission
 )
+from .search import search_products
+from .reservations import release_reservation, confirm_reservations
+from .services import change_order_status, delete_order, generate_order_number
+
+
+def order_items_prefetch():
+    """Prefetch for order items together with the products OrderItemSerializer reads"""
+    return Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+
+
+class TenantDatabaseMixin:
+    """
+    Route user queries to the database of the tenant given by the `tenant`
+    field of the request body. Login and registration come without a JWT,
+    so TenantMiddleware only knows the tenant of a storefront host, and with
+    tenant shards the users live on their tenant's database.
+    """
 
+    def post(self, request, *args, **kwargs):
+        try:
+            tenant_id = int(request.data.get('tenant'))
+        except (TypeError, ValueError):
+            # TenantMiddleware routes to the tenant of the storefront host, if any
+            return super().post(request, *args, **kwargs)
+        with use_tenant_database(db_for_tenant(tenant_id)):
+            return super().post(request, *args, **kwargs)
 
-class RegisterView(generics.CreateAPIView):
+
+class RegisterView(TenantDatabaseMixin, generics.CreateAPIView):
     """
     API endpoint for user registration.
     Public endpoint - no authentication required.
@@ -28,9 +68,10 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
 
 
-class CustomTokenObtainPairView(TokenObtainPairView):
+class CustomTokenObtainPairView(TenantDatabaseMixin, TokenObtainPairView):
     """
     Custom JWT login view with tenant_id and role in token.
+    With tenant shards the request must also give the user's `tenant` id.
     """
     serializer_class = CustomTokenObtainPairSerializer
 
@@ -47,74 +88,163 @@ class TenantViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         # Store owners can only see their own tenant
         if self.request.user.role == User.Role.STORE_OWNER:
-            return Tenant.objects.filter(id=self.request.user.tenant.id)
+            return Tenant.objects.filter(id=self.request.user.tenant_id)
         return Tenant.objects.none()
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CatalogCacheMixin, FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint for Product CRUD operations.
     - Store Owner: Full CRUD access
     - Staff: Read and Update access
     - Customer: Read-only access to active products
+    List and detail responses are cached per tenant and role (see core/caching.py)
+    and carry ETag validators, details also Last-Modified (see core/conditional.py).
     """
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, IsTenantUser, TenantProductPermission]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
-        if not user.tenant:
+        if not user.tenant_id:
             return Product.objects.none()
 
-        queryset = Product.objects.filter(tenant=user.tenant)
+        queryset = Product.objects.filter(tenant_id=user.tenant_id)
 
         # Customers can only see active products
         if user.role == User.Role.CUSTOMER:
             queryset = queryset.filter(is_active=True)
 
-        # Filter by search query if provided
+        # Creator usernames are serialized per row - join them in the same query.
+        # tenant_name comes from the tenant registry and needs no join.
+        # With ?fields= / ?omit= only the selected columns and joins are loaded.
+        serializer = self.get_serializer()
+        if serializer.sparse:
+            queryset = project_queryset(queryset, serializer)
+        else:
+            queryset = queryset.select_related('created_by')
+        queryset = queryset.order_by('-created_at', '-id')
+
+        # Full-text search if provided - results are ordered by relevance
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(sku__icontains=search)
-            )
+            queryset = search_products(queryset, search, user.tenant_id)
 
-        return queryset.order_by('-created_at')
+        return queryset
+
+    def get_change_versions(self):
+        return catalog_cache.versions
 
     def perform_create(self, serializer):
         # Automatically set tenant and created_by
         serializer.save(
-            tenant=self.request.user.tenant,
+            tenant_id=self.request.user.tenant_id,
             created_by=self.request.user
         )
 
     def perform_update(self, serializer):
         # Ensure tenant doesn't change
-        serializer.save(tenant=self.request.user.tenant)
+        serializer.save(tenant_id=self.request.user.tenant_id)
+
+    @action(detail=False, methods=['post'], url_path='bulk',
+            permission_classes=[IsAuthenticated, IsTenantUser, IsStoreOwner])
+    def bulk(self, request):
+        """
+        Create or update products from a CSV or JSONL request body or `file` upload.
+        Products are matched on SKU; the response has per-row errors.
+        Only Store Owners can import.
+        """
+        content_type = request.content_type or ''
+        if content_type.startswith('multipart/form-data'):
+            source = request.FILES.get('file')
+            input_format = source and detect_format(source.content_type, source.name)
+        else:
+            # Read the raw body line by line instead of parsing it into request.data
+            source = request.stream
+            input_format = detect_format(content_type)
+
+        if source is None:
+            return Response(
+                {'error': 'No products were submitted'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if input_format is None:
+            return Response(
+                {'error': 'Send CSV (text/csv) or JSONL (application/x-ndjson)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        report = import_products(request.user.tenant_id, source, input_format, created_by=request.user)
+        return Response(report.as_dict())
+
+
+class StorefrontProductViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Public, read-only catalog of the store served at the request's host
+    (TENANT_BASE_DOMAIN subdomain or custom domain, see TenantMiddleware).
+    No login needed; only active products are listed. Responses are cached
+    per tenant in the catalog cache.
+    """
+    serializer_class = StorefrontProductSerializer
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    pagination_class = KeysetPagination
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.host_tenant is None:
+            raise NotFound('No store is served at this host')
+
+    def get_catalog_scope(self, request):
+        return request.host_tenant.id, 'PUBLIC'
+
+    def get_queryset(self):
+        tenant_id = self.request.host_tenant.id
+        queryset = Product.objects.filter(tenant_id=tenant_id, is_active=True)
+
+        serializer = self.get_serializer()
+        if serializer.sparse:
+            queryset = project_queryset(queryset, serializer)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        search = self.request.query_params.get('search', None)
+        if search:
+            queryset = search_products(queryset, search, tenant_id)
+
+        return queryset
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(IdempotentCreateMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint for Order CRUD operations.
     - Store Owner: Full access to all tenant orders
     - Staff: View and update orders
     - Customer: Create and view only their own orders
+    List and detail responses carry ETag validators, details also Last-Modified.
+    Creating with an Idempotency-Key header is safe to retry.
     """
     permission_classes = [IsAuthenticated, IsTenantUser, TenantOrderPermission]
+    pagination_class = KeysetPagination
+
+    # Actions that render a list of orders with OrderListSerializer
+    list_actions = ['list', 'my_orders']
+
+    # Actions that render a single order with its items
+    detail_actions = ['create', 'retrieve', 'update', 'partial_update', 'update_status']
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in self.list_actions:
             return OrderListSerializer
         return OrderSerializer
 
-    def get_queryset(self):
+    def get_base_queryset(self):
+        """Orders visible to the user, without joins or annotations"""
         user = self.request.user
-        if not user.tenant:
+        if not user.tenant_id:
             return Order.objects.none()
 
-        queryset = Order.objects.filter(tenant=user.tenant)
+        queryset = Order.objects.filter(tenant_id=user.tenant_id)
 
         # Customers can only see their own orders
         if user.role == User.Role.CUSTOMER:
@@ -125,20 +255,50 @@ class OrderViewSet(viewsets.ModelViewSet):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
 
-        return queryset.select_related('customer', 'tenant').prefetch_related('items').order_by('-created_at')
+        return queryset
 
-    def perform_create(self, serializer):
-        # Generate unique order number
-        order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+    def get_validator_queryset(self):
+        # The customer join and items are not needed for the updated_at lookup
+        return self.get_base_queryset()
 
-        # Automatically set tenant and customer
-        serializer.save(
-            tenant=self.request.user.tenant,
+    def get_change_versions(self):
+        return order_versions
+
+    def get_queryset(self):
+        queryset = self.get_base_queryset()
+
+        # With ?fields= / ?omit= only the selected columns, joins and items are loaded
+        serializer = self.get_serializer()
+        if serializer.sparse:
+            queryset = project_queryset(queryset, serializer)
+        else:
+            queryset = queryset.select_related('customer')
+
+        if self.action in self.list_actions:
+            # Count items in SQL instead of one COUNT(*) per order
+            if 'items_count' in serializer.fields:
+                queryset = queryset.annotate(items_count=Count('items'))
+        elif self.action in self.detail_actions:
+            if 'items' in serializer.fields:
+                queryset = queryset.prefetch_related(order_items_prefetch())
+
+        return queryset.order_by('-created_at', '-id')
+
+    def perform_create(self, serializer):
+        # Automatically set tenant, customer and order number
+        order = serializer.save(
+            tenant_id=self.request.user.tenant_id,
             customer=self.request.user,
-            order_number=order_number
+            order_number=generate_order_number(self.request.user.tenant_id)
         )
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsStoreOwnerOrStaff])
+        # Load items with their products in one query for the response
+        prefetch_related_objects([order], order_items_prefetch())
+
+    def perform_destroy(self, instance):
+        delete_order(instance)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsTenantUser, IsStoreOwnerOrStaff])
     def update_status(self, request, pk=None):
         """
         Custom action to update order status.
@@ -153,12 +313,38 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.status = new_status
-        order.save()
+        change = change_order_status(order.tenant_id, new_status, [order.id])
+        if not change.updated:
+            return Response(
+                {'error': change.rejected[0]['error']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        order.refresh_from_db(fields=['status', 'updated_at'])
 
         serializer = self.get_serializer(order)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsTenantUser, IsStoreOwnerOrStaff])
+    def batch_status(self, request):
+        """
+        Move many orders to a new status at once, e.g. CONFIRMED -> SHIPPED.
+        Send `ids`, or `from_status` (optionally with `created_before`) to pick them.
+        Only allowed transitions are applied; the response lists updated and rejected ids.
+        Only Store Owner and Staff can update status.
+        """
+        serializer = OrderBatchStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        filters = {}
+        if 'from_status' in data:
+            filters['status'] = data['from_status']
+        if 'created_before' in data:
+            filters['created_at__lt'] = data['created_before']
+
+        change = change_order_status(request.user.tenant_id, data['status'], data.get('ids'), **filters)
+        return Response(change.as_dict())
+
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
         """
@@ -170,12 +356,163 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        orders = self.get_queryset().filter(customer=request.user)
-        page = self.paginate_queryset(orders)
+        # get_queryset already narrows customers to their own orders
+        return self.list(request)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsTenantUser, IsStoreOwner])
+    def export(self, request):
+        """
+        Stream all of the tenant's orders with their items as CSV or JSONL.
+        Filters: status, created_after (inclusive), created_before (exclusive).
+        Only Store Owners can export.
+        """
+        # Not ?format= - DRF uses that to pick a renderer
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in FORMATS:
+            return Response(
+                {'error': f"export_format must be one of: {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        status_filter = request.query_params.get('status')
+        if status_filter and status_filter not in Order.Status.values:
+            return Response(
+                {'error': 'Invalid status value'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        bounds = {}
+        for param in ('created_after', 'created_before'):
+            if request.query_params.get(param):
+                try:
+                    bounds[param] = parse_bound(request.query_params[param])
+                except ValueError as exc:
+                    return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The stream is consumed after the request's database routing ended
+        chunks = iter_order_chunks(
+            request.user.tenant_id, status=status_filter, using=router.db_for_read(Order), **bounds
+        )
+        stream = stream_csv(chunks) if export_format == 'csv' else stream_jsonl(chunks)
+
+        response = StreamingHttpResponse(stream, content_type=CONTENT_TYPES[export_format])
+        filename = f"orders-{request.tenant.subdomain}-{timezone.now():%Y%m%d}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class StockReservationViewSet(mixins.CreateModelMixin,
+                              mixins.ListModelMixin,
+                              mixins.RetrieveModelMixin,
+                              mixins.DestroyModelMixin,
+                              viewsets.GenericViewSet):
+    """
+    API endpoint for holding stock while a customer checks out.
+    - POST: hold units of a product for `ttl_seconds`
+    - DELETE: release a hold
+    - confirm: turn holds into an order
+    Expired holds are released by the `release_expired_reservations` command.
+    """
+    serializer_class = StockReservationSerializer
+    permission_classes = [IsAuthenticated, IsTenantUser, IsCustomer]
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = StockReservation.objects.filter(tenant_id=user.tenant_id, customer=user)
+
+        # Filter by status if provided
+        status_filter = self.request.query_params.get('status', None)
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+
+        return queryset.select_related('product').order_by('-created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(
+            tenant_id=self.request.user.tenant_id,
+            customer=self.request.user
+        )
+
+    def destroy(self, request, *args, **kwargs):
+        reservation = self.get_object()
+        if not release_reservation(reservation):
+            return Response(
+                {'error': 'Reservation is no longer held'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'])
+    def confirm(self, request):
+        """
+        Create an order from held reservations.
+        """
+        serializer = ReservationConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        order = confirm_reservations(
+            tenant_id=request.user.tenant_id,
+            customer=request.user,
+            reservation_ids=data.pop('reservations'),
+            order_number=generate_order_number(request.user.tenant_id),
+            **data
+        )
+        prefetch_related_objects([order], order_items_prefetch())
+
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Sales reports for store owners, read from the pre-aggregated
+    DailySales / ProductDailySales tables (see core/analytics.py).
+    Query parameters: date_from, date_to (default: the last 30 days).
+    """
+    permission_classes = [IsAuthenticated, IsTenantUser, IsStoreOwner]
+
+    def get_range(self, request):
+        serializer = SalesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        """Order count, units and revenue per day, plus totals over the range"""
+        params = self.get_range(request)
+        days = DailySales.objects.filter(
+            tenant_id=request.user.tenant_id,
+            date__range=(params['date_from'], params['date_to']),
+        ).order_by('date')
+        totals = days.aggregate(order_count=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'))
+
+        return Response({
+            'date_from': params['date_from'],
+            'date_to': params['date_to'],
+            'totals': {
+                'order_count': totals['order_count'] or 0,
+                'units': totals['units'] or 0,
+                'revenue': DailySalesSerializer().fields['revenue'].to_representation(totals['revenue'] or 0),
+            },
+            'days': DailySalesSerializer(days, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def products(self, request):
+        """Best-selling products by revenue over the range. `limit` caps the list (default 20, at most 1000)."""
+        params = self.get_range(request)
+        products = (
+            ProductDailySales.objects
+            .filter(tenant_id=request.user.tenant_id, date__range=(params['date_from'], params['date_to']))
+            .values('product_id', 'product__name', 'product__sku')
+            .annotate(total_orders=Sum('order_count'), total_units=Sum('units'), total_revenue=Sum('revenue'))
+            # Products whose orders were all cancelled
+            .filter(total_units__gt=0)
+            .order_by('-total_revenue', 'product_id')[:params['limit']]
+        )
+
+        return Response({
+            'date_from': params['date_from'],
+            'date_to': params['date_to'],
+            'products': ProductSalesSerializer(products, many=True).data,
+        })
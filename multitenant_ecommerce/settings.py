@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.TenantMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'multitenant_ecommerce.urls'
@@ -87,6 +88,46 @@ DATABASES = {
     }
 }
 
+# Read replica (core/routers.py). When REPLICA_DATABASE_NAME is set, reads of
+# GET/HEAD/OPTIONS API requests go to it. Users who just wrote keep reading from
+# the primary for REPLICA_PIN_SECONDS, which should exceed the replication lag.
+REPLICA_DATABASE_NAME = config('REPLICA_DATABASE_NAME', default='')
+if REPLICA_DATABASE_NAME:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': REPLICA_DATABASE_NAME,
+    }
+READ_REPLICA_ALIAS = 'replica' if REPLICA_DATABASE_NAME else None
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+# Tenant shards (core/routers.py): TENANT_SHARDS=shard1=db.shard1.sqlite3,shard2=...
+# adds SQLite databases that tenants can be moved to with `manage.py move_tenant_shard`.
+# Ids of tenant rows created on the n-th shard start at n * SHARD_ID_BLOCK, so
+# rows keep their ids when a tenant moves.
+TENANT_SHARDS = []
+for shard in config('TENANT_SHARDS', default='', cast=Csv()):
+    alias, _, name = shard.partition('=')
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+    }
+    TENANT_SHARDS.append(alias)
+SHARD_ID_BLOCK = 10 ** 12
+
+DATABASE_ROUTERS = ['core.routers.TenantShardRouter', 'core.routers.ReplicaRouter']
+
+
+# Cache
+# Local memory by default. Any Django backend works, e.g. file based
+# (django.core.cache.backends.filebased.FileBasedCache with a directory as
+# location) or database (DatabaseCache, run `python manage.py createcachetable`).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='multitenant-ecommerce'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -135,11 +176,15 @@ AUTH_USER_MODEL = 'core.User'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.TenantJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.TenantRateThrottle',
+        'core.throttling.UserRateThrottle',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
@@ -164,6 +209,82 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Build request.user from the JWT claims (id, tenant_id, role, is_active) instead
+# of loading it from the users table; other fields are loaded on first access.
+# Deactivated users keep access until their current access token expires.
+STATELESS_PRINCIPAL = config('STATELESS_PRINCIPAL', default=False, cast=bool)
+
+# In-process tenant registry (core/tenants.py)
+# Storefronts are served at <subdomain>.TENANT_BASE_DOMAIN (e.g. techstore.shop.example.com,
+# allow `.shop.example.com` in ALLOWED_HOSTS) and at each tenant's custom domain
+TENANT_BASE_DOMAIN = config('TENANT_BASE_DOMAIN', default='')
+TENANT_CACHE_TTL = config('TENANT_CACHE_TTL', default=300, cast=int)  # seconds
+TENANT_CACHE_MAX_SIZE = config('TENANT_CACHE_MAX_SIZE', default=1024, cast=int)
+
+# Stock decrements (core/inventory.py) retry lock timeouts with exponential backoff
+INVENTORY_MAX_RETRIES = 3
+INVENTORY_RETRY_BACKOFF = 0.01  # seconds, doubled on every retry
+
+# Stock reservations (core/reservations.py)
+RESERVATION_TTL = config('RESERVATION_TTL', default=900, cast=int)  # seconds
+RESERVATION_MAX_TTL = config('RESERVATION_MAX_TTL', default=3600, cast=int)
+
+# Idempotency-Key support for order creation (core/idempotency.py): how long keys
+# replay their response and how long a running request holds its key
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)  # seconds
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=60, cast=int)  # seconds
+
+# Order numbers (core/ordernumbers.py): per-tenant sequences handed out in blocks
+# of ORDER_NUMBER_BLOCK_SIZE, or core.ordernumbers.TimeOrderedOrderNumberGenerator
+ORDER_NUMBER_GENERATOR = config('ORDER_NUMBER_GENERATOR', default='core.ordernumbers.SequenceOrderNumberGenerator')
+ORDER_NUMBER_BLOCK_SIZE = config('ORDER_NUMBER_BLOCK_SIZE', default=50, cast=int)
+
+# Order event webhooks (core/outbox.py, process_outbox command)
+OUTBOX_WORKERS = config('OUTBOX_WORKERS', default=8, cast=int)  # delivery threads
+OUTBOX_WEBHOOK_TIMEOUT = config('OUTBOX_WEBHOOK_TIMEOUT', default=5, cast=float)  # seconds
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=10, cast=int)
+OUTBOX_RETRY_BACKOFF = 30  # seconds, doubled after every failed attempt
+OUTBOX_RETRY_MAX_BACKOFF = 3600  # seconds
+OUTBOX_CLAIM_SECONDS = 300  # how long a worker holds the events it is sending
+
+# Product search backend (core/search.py). Empty picks SQLite FTS5 or PostgreSQL
+# full-text search from the database vendor, falling back to LIKE scans.
+PRODUCT_SEARCH_BACKEND = config('PRODUCT_SEARCH_BACKEND', default='')
+
+# Product list/detail response cache (core/caching.py)
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+
+# Bulk product import (core/imports.py): rows per validated/upserted chunk and
+# the number of row errors returned in the report
+PRODUCT_IMPORT_CHUNK_SIZE = config('PRODUCT_IMPORT_CHUNK_SIZE', default=1000, cast=int)
+PRODUCT_IMPORT_MAX_ERRORS = config('PRODUCT_IMPORT_MAX_ERRORS', default=1000, cast=int)
+
+# Orders read per query by the streaming order export (core/exports.py)
+ORDER_EXPORT_CHUNK_SIZE = config('ORDER_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Opt-in fast path for product and order list pages (core/rendering.py):
+# values()-based serializers and an orjson renderer (used when orjson is installed)
+FAST_RENDERING = config('FAST_RENDERING', default=False, cast=bool)
+if FAST_RENDERING:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'core.rendering.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+
+# Request rate limits (core/throttling.py): token buckets of requests per second
+# and burst size. Tenant.rate_limit/burst_limit override the tenant defaults.
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_LEASE_SECONDS = config('THROTTLE_LEASE_SECONDS', default=0.1, cast=float)
+TENANT_RATE_LIMIT = config('TENANT_RATE_LIMIT', default=100, cast=int)
+TENANT_BURST_LIMIT = config('TENANT_BURST_LIMIT', default=200, cast=int)
+USER_RATE_LIMITS = {  # role -> (rate, burst)
+    'STORE_OWNER': (50, 100),
+    'STAFF': (50, 100),
+    'CUSTOMER': (20, 40),
+}
+
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
 CORS_ALLOW_CREDENTIALS = True
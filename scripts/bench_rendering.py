@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark the regular and FAST_RENDERING list paths on 1k-row pages.
+Regular: model instances -> ModelSerializer -> JSONRenderer.
+Fast: values() rows -> ValuesSerializer -> FastJSONRenderer (orjson if installed).
+Run: python scripts/bench_rendering.py [--rows 1000] [--repeat 20]
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from benchmark_utils import setup_django, create_tenant
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--rows', type=int, default=1000)
+parser.add_argument('--repeat', type=int, default=20)
+args = parser.parse_args()
+
+setup_django()
+
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from core.models import Product, Order, OrderItem
+from core.rendering import FastJSONRenderer, ValuesSerializer, orjson
+from core.serializers import ProductSerializer, OrderListSerializer
+
+tenant, owner, customer = create_tenant()
+
+products = Product.objects.bulk_create([
+    Product(tenant=tenant, name=f'Product {i}', description='Lorem ipsum dolor sit amet. ' * 8,
+            price=Decimal('9.99') + i, stock_quantity=100, sku=f'SKU-{i}', created_by=owner)
+    for i in range(args.rows)
+])
+orders = Order.objects.bulk_create([
+    Order(tenant=tenant, customer=customer, order_number=f'ORD-{i:08d}',
+          total_amount=Decimal('19.98'), shipping_address='1 Main St')
+    for i in range(args.rows)
+])
+OrderItem.objects.bulk_create([
+    OrderItem(order=order, product=products[i], quantity=2,
+              price_at_order=Decimal('9.99'), subtotal=Decimal('19.98'))
+    for i, order in enumerate(orders)
+])
+
+pages = [
+    ('products', ProductSerializer,
+     Product.objects.filter(tenant=tenant).select_related('created_by').order_by('-created_at', '-id')),
+    ('orders', OrderListSerializer,
+     Order.objects.filter(tenant=tenant).select_related('customer')
+     .annotate(items_count=Count('items')).order_by('-created_at', '-id')),
+]
+
+
+def best_of(render):
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        content = render()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, content
+
+
+print(f"orjson: {'installed' if orjson else 'not installed, using the json module'}")
+for label, serializer_class, queryset in pages:
+    regular_ms, regular = best_of(
+        lambda: JSONRenderer().render(serializer_class(queryset[:args.rows], many=True).data)
+    )
+
+    compiled = ValuesSerializer(serializer_class())
+    fast_ms, fast = best_of(
+        lambda: FastJSONRenderer().render(compiled.to_representation(compiled.queryset(queryset)[:args.rows]))
+    )
+
+    assert fast == regular, f"{label}: fast path output differs"
+    print(f"{label} ({args.rows} rows): regular {regular_ms:.1f} ms, fast {fast_ms:.1f} ms, "
+          f"{regular_ms / fast_ms:.1f}x, {len(fast) / 1024:.0f} KiB")
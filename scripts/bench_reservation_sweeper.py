@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Benchmark the expired-reservation sweeper with 100k outstanding holds.
+Run: python scripts/bench_reservation_sweeper.py [--holds 100000] [--batch-size 1000]
+"""
+import argparse
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmark_utils import setup_django, create_tenant, timed
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--holds', type=int, default=100000)
+parser.add_argument('--products', type=int, default=500)
+parser.add_argument('--batch-size', type=int, default=1000)
+args = parser.parse_args()
+
+setup_django()
+
+from django.db.models import Sum
+from django.utils import timezone
+from core.models import Product, StockReservation
+from core.reservations import release_expired_reservations
+
+tenant, owner, customer = create_tenant()
+
+products = Product.objects.bulk_create([
+    Product(tenant=tenant, name=f'Product {i}', price=Decimal('9.99'),
+            stock_quantity=0, sku=f'SKU-{i}', created_by=owner)
+    for i in range(args.products)
+])
+
+expired = timezone.now() - timedelta(minutes=1)
+with timed(f"Created {args.holds} expired holds"):
+    StockReservation.objects.bulk_create([
+        StockReservation(
+            tenant=tenant, product=products[i % len(products)], customer=customer,
+            quantity=1, expires_at=expired
+        )
+        for i in range(args.holds)
+    ], batch_size=5000)
+
+with timed(f"Released holds in batches of {args.batch_size}"):
+    released = release_expired_reservations(batch_size=args.batch_size)
+
+restocked = Product.objects.aggregate(total=Sum('stock_quantity'))['total']
+print(f"Released: {released}, units back in stock: {restocked}")
+assert released == restocked == args.holds
@@ -0,0 +1,54 @@
+"""
+Shared setup for the benchmark scripts.
+Benchmarks run against a throwaway SQLite database, never against db.sqlite3.
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """Configure Django with a fresh, migrated temporary database"""
+    sys.path.insert(0, PROJECT_ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'multitenant_ecommerce.settings')
+
+    from django.conf import settings
+    db_dir = tempfile.mkdtemp(prefix='bench-')
+    settings.DATABASES['default']['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def create_tenant(name='Bench Store'):
+    from core.models import Tenant, User
+
+    tenant = Tenant.objects.create(
+        store_name=name,
+        subdomain=name.lower().replace(' ', '-'),
+        contact_email='bench@example.com'
+    )
+    owner = User.objects.create_user(
+        username=f'{tenant.subdomain}-owner', password='password123',
+        tenant=tenant, role=User.Role.STORE_OWNER
+    )
+    customer = User.objects.create_user(
+        username=f'{tenant.subdomain}-customer', password='password123',
+        tenant=tenant, role=User.Role.CUSTOMER
+    )
+    return tenant, owner, customer
+
+
+@contextmanager
+def timed(label):
+    started = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {elapsed * 1000:.1f} ms")
@@ -33,7 +33,7 @@ headers = {"Authorization": f"Bearer {customer_token}"}
 response = requests.get(f"{BASE_URL}/products/", headers=headers)
 products = response.json()
 print(f"Status: {response.status_code}")
-print(f"Total Products: {products['count']}")
+print(f"Products (first page): {len(products['results'])}")
 for product in products['results']:
     print(f"  - {product['name']}: ${product['price']} (Stock: {product['stock_quantity']})")
 
@@ -69,7 +69,7 @@ print("-" * 60)
 response = requests.get(f"{BASE_URL}/orders/my_orders/", headers=headers)
 orders = response.json()
 print(f"Status: {response.status_code}")
-print(f"Total Orders: {orders['count']}")
+print(f"Orders (first page): {len(orders['results'])}")
 for order in orders['results']:
     print(f"  - {order['order_number']}: ${order['total_amount']} ({order['status']})")
 
@@ -94,7 +94,7 @@ headers_owner = {"Authorization": f"Bearer {owner_token}"}
 response = requests.get(f"{BASE_URL}/orders/", headers=headers_owner)
 orders = response.json()
 print(f"Status: {response.status_code}")
-print(f"Total Orders: {orders['count']}")
+print(f"Orders (first page): {len(orders['results'])}")
 for order in orders['results']:
     print(f"  - {order['order_number']}: ${order['total_amount']} ({order['status']}) - {order['customer_username']}")
 
@@ -148,7 +148,7 @@ headers_fashion = {"Authorization": f"Bearer {fashion_token}"}
 response = requests.get(f"{BASE_URL}/products/", headers=headers_fashion)
 products = response.json()
 print(f"Status: {response.status_code}")
-print(f"Total Products: {products['count']}")
+print(f"Products (first page): {len(products['results'])}")
 for product in products['results']:
     print(f"  - {product['name']}: ${product['price']} (Tenant: {product['tenant_name']})")
 